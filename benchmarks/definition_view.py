@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Measure rendering time of the largest entries of the installed WordNet, as one label and as a definition list.
+
+A single label lays out the whole definition at once, while the definition list only lays out the rows on screen.
+Both are measured with Pango layouts off screen, so no display is needed, though PyGObject and Pango are.
+
+Usage: python benchmarks/definition_view.py [--count 20] [--repeat 5] [--width 500] [--height 600] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.get_definition import polysemous_terms  # noqa: E402
+from wordbook import base  # noqa: E402
+
+
+def median_ms(function, repeat):
+    """Return the median time in milliseconds of calling function."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def layout_height(context, markup, width):
+    """Lay out markup wrapped to width pixels, like a label does. Return its height in pixels."""
+    from gi.repository import Pango
+
+    layout = Pango.Layout.new(context)
+    layout.set_width(width * Pango.SCALE)
+    layout.set_wrap(Pango.WrapMode.WORD)
+    layout.set_markup(markup, -1)
+    return layout.get_pixel_size()[1]
+
+
+def layout_visible_rows(context, sections, width, height):
+    """Lay out rows of the definition list until they fill height pixels. Return the number of rows laid out."""
+    rows = [row for heading, synsets in sections for row in (heading, *synsets)]
+    filled = 0
+    for count, row in enumerate(rows, 1):
+        filled += layout_height(context, row, width)
+        if filled >= height:
+            return count
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=20, help="number of entries to render")
+    parser.add_argument("--repeat", type=int, default=5, help="renders of each entry")
+    parser.add_argument("--width", type=int, default=500, help="width of the definition in pixels")
+    parser.add_argument("--height", type=int, default=600, help="height of the visible part of the list in pixels")
+    parser.add_argument("--json", help="write the results as JSON to PATH")
+    args = parser.parse_args()
+
+    import gi
+
+    gi.require_version("Pango", "1.0")
+    gi.require_version("PangoCairo", "1.0")
+    from gi.repository import PangoCairo
+
+    context = PangoCairo.FontMap.get_default().create_context()
+    wn_instance = base.import_wn().Wordnet(lexicon=base.WN_DB_VERSION)
+    colors = base.get_colors(False)
+
+    results = []
+    print(f"{'term':<20} {'rows':>5} {'visible':>7} {'label ms':>9} {'list ms':>8} {'speedup':>8}")
+    for term in polysemous_terms(args.count):
+        result = base._get_definition(term, wn_instance)[0]["result"]
+        sections = base.process_result_sections(result, *colors)
+        rows = sum(1 + len(synsets) for _heading, synsets in sections)
+        visible = layout_visible_rows(context, sections, args.width, args.height)
+        label_ms = median_ms(
+            lambda: layout_height(context, base.process_result(result, *colors), args.width), args.repeat
+        )
+        list_ms = median_ms(
+            lambda: layout_visible_rows(
+                context, base.process_result_sections(result, *colors), args.width, args.height
+            ),
+            args.repeat,
+        )
+        results.append({"term": term, "rows": rows, "visible": visible, "label_ms": label_ms, "list_ms": list_ms})
+        print(f"{term:<20} {rows:>5} {visible:>7} {label_ms:>9.2f} {list_ms:>8.2f} {label_ms / list_ms:>7.1f}x")
+    label_total = sum(result["label_ms"] for result in results)
+    list_total = sum(result["list_ms"] for result in results)
+    print(f"{'total':<20} {'':>5} {'':>7} {label_total:>9.2f} {list_total:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"width": args.width, "height": args.height, "results": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Benchmark get_definition on the most polysemous entries of the installed WordNet.
+
+Compares the batched lookup against the per-synset python-wn ORM walk it replaced, and checks that both give the
+same result.
+
+Usage: python benchmarks/get_definition.py [--count N] [--repeat N]
+"""
+
+import argparse
+import difflib
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wordbook import base  # noqa: E402
+
+
+def orm_definition(term, wn_instance):
+    """Build the result of get_definition by walking python-wn objects, as done before the batched lookup."""
+    actual_pos = {"s": "adjective", "n": "noun", "v": "verb", "r": "adverb", "a": "adjective", "t": "phrase"}
+    actual_pos.update({"c": "conjunction", "p": "adposition", "x": "other", "u": "unknown"})
+    result_dict = {pos: [] for pos in dict.fromkeys(actual_pos.values())}
+    first_match = None
+    for synset in wn_instance.synsets(term):
+        lemma_names = synset.lemmas()
+        diff_match = difflib.get_close_matches(term, lemma_names)
+        synset_name = diff_match[0].strip() if diff_match else lemma_names[0]
+        if not first_match:
+            first_match = synset_name
+        result_dict[actual_pos[synset.pos]].append(
+            {
+                "name": synset_name,
+                "definition": synset.definition(),
+                "examples": synset.examples(),
+                "syn": [n for n in (lemma.replace("_", " ").strip() for lemma in lemma_names) if n != first_match],
+                "ant": [a.word().lemma() for sense in synset.senses() for a in sense.get_related("antonym")],
+                "sim": [lemma for sim in synset.get_related("similar") for lemma in sim.lemmas()],
+                "also_sees": [lemma for also in synset.get_related("also") for lemma in also.lemmas()],
+            }
+        )
+    return first_match, result_dict
+
+
+def polysemous_terms(count):
+    """Get the lemmas with the most synsets."""
+    with sqlite3.connect(f"file:{base.LOOKUP_ENGINE.database_path}?mode=ro", uri=True) as connection:
+        return [
+            row[0]
+            for row in connection.execute(
+                "SELECT f.form FROM forms AS f JOIN senses AS s ON s.entry_rowid = f.entry_rowid WHERE f.rank = 0 "
+                "GROUP BY f.form ORDER BY COUNT(DISTINCT s.synset_rowid) DESC, f.form LIMIT ?",
+                (count,),
+            )
+        ]
+
+
+def time_lookups(function, terms, wn_instance, repeat):
+    """Return the median time in milliseconds of looking up each term."""
+    timings = {}
+    for term in terms:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function(term, wn_instance)
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[term] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=20, help="number of entries to look up")
+    parser.add_argument("--repeat", type=int, default=5, help="lookups per entry")
+    args = parser.parse_args()
+
+    wn_instance = base.import_wn().Wordnet(lexicon=base.WN_DB_VERSION)
+    terms = polysemous_terms(args.count)
+
+    for term in terms:
+        clean_def, _ = base._get_definition(term, wn_instance)
+        if (clean_def["term"], clean_def["result"]) != orm_definition(term, wn_instance):
+            sys.exit(f"Batched lookup differs from python-wn for {term!r}.")
+
+    orm = time_lookups(orm_definition, terms, wn_instance, args.repeat)
+    batched = time_lookups(base._get_definition, terms, wn_instance, args.repeat)
+
+    print(f"{'term':<20} {'synsets':>7} {'orm ms':>9} {'batched ms':>11} {'speedup':>8}")
+    for term in terms:
+        synsets = len(wn_instance.synsets(term))
+        print(f"{term:<20} {synsets:>7} {orm[term]:>9.2f} {batched[term]:>11.2f} {orm[term] / batched[term]:>7.1f}x")
+    print(f"{'total':<20} {'':>7} {sum(orm.values()):>9.2f} {sum(batched.values()):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Measure how long importing the lookup code takes, using python -X importtime.
+
+Fails if importing wordbook.base pulls in a module that should only be imported on first use, or takes longer than
+the budget.
+
+Usage: python benchmarks/import_time.py [--module wordbook.base] [--budget-ms 60] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the lookup code must not import until they are needed.
+LAZY_MODULES = ("gi", "wn", "difflib", "subprocess")
+
+
+def import_times(module):
+    """Import module in a fresh interpreter. Return {module: (self us, cumulative us)} and the loaded modules."""
+    check = f"import sys, {module}; print(' '.join(sys.modules))"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        check=True,
+        cwd=ROOT,
+        text=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times, set(process.stdout.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="wordbook.base", help="module to import")
+    parser.add_argument("--budget-ms", type=float, default=60, help="largest acceptable median import time")
+    parser.add_argument("--repeat", type=int, default=5, help="number of fresh interpreters to measure")
+    args = parser.parse_args()
+
+    startup_times, _modules = import_times("sys")  # Imported by the interpreter itself, not by the module.
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    cumulative = statistics.median(times[args.module][1] for times, _modules in runs) / 1000
+    times, modules = runs[-1]
+    times = {name: value for name, value in times.items() if name not in startup_times}
+
+    print(f"{args.module}: {cumulative:.1f} ms (median of {args.repeat}, budget {args.budget_ms:g} ms)")
+    print("Slowest modules of the last run, by own import time:")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:10]:
+        print(f"  {name:<40} {self_us / 1000:>7.2f} ms {cumulative_us / 1000:>8.2f} ms cumulative")
+
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        sys.exit(f"{args.module} imports {', '.join(eager)} on load.")
+    if cumulative > args.budget_ms:
+        sys.exit(f"{args.module} takes longer to import than the budget.")
+
+
+if __name__ == "__main__":
+    main()
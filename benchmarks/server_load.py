@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Load test a lookup server started with `wordbook --serve HOST:PORT`.
+
+Sends concurrent define and complete requests for terms from the wordlist, then prints the client side latency
+percentiles next to the server's own /stats.
+
+Usage: python benchmarks/server_load.py [--address 127.0.0.1:8765] [--clients N] [--requests N]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import quote
+
+
+def request(address, path):
+    """GET path from the server and return the status and decoded JSON body."""
+    host, _, port = address.rpartition(":")
+    connection = HTTPConnection(host, int(port), timeout=30)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, json.loads(body) if body else None
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--address", default="127.0.0.1:8765", help="server address")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests")
+    args = parser.parse_args()
+
+    seeds = [
+        word
+        for letter in "abcdefghijklmnopqrstuvwxyz"
+        for word in request(args.address, f"/complete?q={letter}&limit=50")[1]["completions"]
+    ]
+    paths = []
+    for _ in range(args.requests):
+        term = random.choice(seeds)
+        if random.random() < 0.5:
+            paths.append(f"/define?q={quote(term)}&pronounce=no")
+        else:
+            paths.append(f"/complete?q={quote(term[: random.randint(1, len(term))])}")
+
+    def timed(path):
+        started = time.perf_counter()
+        status, _body = request(args.address, path)
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(timed, paths))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    refused = sum(1 for status, _latency in results if status == 503)
+    print(f"{len(results)} requests in {elapsed:.2f} s ({len(results) / elapsed:.0f}/s), {refused} refused")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"client p50 {quantiles[49]:.2f} ms, p95 {quantiles[94]:.2f} ms, p99 {quantiles[98]:.2f} ms")
+    print(json.dumps(request(args.address, "/stats")[1], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Measure how long Wordbook takes from process start to its first frame, and until lookups are ready.
+
+Runs the application with the hidden --startup-timing option, which prints the time of each stage and quits once
+WordNet and the wordlist are loaded. WordNet must already be downloaded, and a display is needed.
+
+Usage: python benchmarks/startup.py [--command wordbook] [--repeat 5] [--json PATH]
+"""
+
+import argparse
+import json
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+STAGES = ("first-frame", "ready")
+
+
+def measure_startup(command, timeout):
+    """Start the application once. Return the seconds from spawning it to each stage."""
+    started = time.time()
+    process = subprocess.run(
+        [*command, "--startup-timing"],
+        capture_output=True,
+        check=False,
+        text=True,
+        timeout=timeout,
+    )
+    stages = {}
+    for line in process.stdout.splitlines():
+        stage, _, timestamp = line.partition(" ")
+        if stage in STAGES:
+            stages[stage] = float(timestamp) - started
+    missing = [stage for stage in STAGES if stage not in stages]
+    if missing:
+        sys.exit(f"{' '.join(command)} did not report {', '.join(missing)}:\n{process.stderr}")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--command", default="wordbook", help="command starting Wordbook")
+    parser.add_argument("--repeat", type=int, default=5, help="number of application starts")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for a start")
+    parser.add_argument("--json", help="write the results as JSON to PATH")
+    args = parser.parse_args()
+
+    command = shlex.split(args.command)
+    measure_startup(command, args.timeout)  # Warm up the disk cache and build the snapshots.
+    runs = [measure_startup(command, args.timeout) for _ in range(args.repeat)]
+
+    results = []
+    print(f"{'stage':<12} {'min ms':>9} {'median ms':>10} {'max ms':>9}")
+    for stage in STAGES:
+        timings = [run[stage] * 1000 for run in runs]
+        result = {
+            "name": stage,
+            "min_ms": min(timings),
+            "median_ms": statistics.median(timings),
+            "max_ms": max(timings),
+        }
+        results.append(result)
+        print(f"{stage:<12} {result['min_ms']:>9.1f} {result['median_ms']:>10.1f} {result['max_ms']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"command": args.command, "runs": runs, "results": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
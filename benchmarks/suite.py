@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Time the hot paths of the lookup code offline.
+
+WordNet is loaded from the bundled fixture lexicon into a temporary data directory, and a fake espeak-ng is put on
+PATH, so nothing touches the network or the user's data. Results are printed as a table and can be written as JSON,
+and compared against an earlier JSON run to catch regressions.
+
+Usage: python benchmarks/suite.py [--filter TEXT] [--json PATH] [--compare PATH] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "lexicon.xml")
+FIXTURE_TERMS = ("run", "fast", "dog", "dog days", "quick", "Canis familiaris", "no such word")
+
+# Answers like espeak-ng does, but instantly and without audio.
+FAKE_ESPEAK = """#!/usr/bin/env python3
+import sys
+args = sys.argv[1:]
+if "--version" in args:
+    print("eSpeak NG text-to-speech: 0.0-fake  Data at: /dev/null")
+elif "--stdin" in args:
+    for line in sys.stdin:
+        if line.strip():
+            print(" " + line.strip()[::-1])
+elif "--ipa" in args:
+    print(" " + args[-1][::-1])
+"""
+
+
+def setup_environment(directory):
+    """Point Wordbook at a temporary home holding the fixture lexicon, and put a fake espeak-ng on PATH."""
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(directory, "config")
+    os.environ["XDG_DATA_HOME"] = os.path.join(directory, "data")
+    bin_dir = os.path.join(directory, "bin")
+    os.makedirs(bin_dir)
+    espeak = os.path.join(bin_dir, "espeak-ng")
+    with open(espeak, "w") as espeak_file:
+        espeak_file.write(FAKE_ESPEAK)
+    os.chmod(espeak, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    sys.path.insert(0, ROOT)
+
+    from wordbook import base
+
+    base.create_required_dirs()
+    os.makedirs(os.path.dirname(base.LOOKUP_ENGINE.database_path), exist_ok=True)
+    wn = base.import_wn()
+    wn.add(FIXTURE, progress_handler=None)
+    return wn.Wordnet(lexicon=base.WN_DB_VERSION)
+
+
+def synthetic_lemmas(count):
+    """Make a reproducible wordlist of roughly the size of WordNet's."""
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    lemmas = set()
+    while len(lemmas) < count:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(3, 12)))
+        lemmas.add(word if rng.random() < 0.9 else f"{word}_{rng.choice(letters) * 3}")
+    return sorted(lemmas)
+
+
+def measure(function, min_time=0.2, max_rounds=100000):
+    """Call function repeatedly for at least min_time seconds and return per-call timings in microseconds."""
+    function()  # Warm up.
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_rounds and (len(timings) < 5 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def define_benchmarks(wn_instance, directory):
+    """Return the benchmarks as (name, function) pairs."""
+    from wordbook import base, wordlist
+    from wordbook.settings import Settings
+
+    def each(function, *args):
+        return lambda: [function(term, *args) for term in FIXTURE_TERMS]
+
+    def uncached_definitions():
+        base.DEFINITION_CACHE.clear()
+        for term in FIXTURE_TERMS:
+            base.get_definition(term, wn_instance)
+
+    results = [base.get_definition(term, wn_instance)[0]["result"] for term in FIXTURE_TERMS]
+    results = [result for result in results if result is not None]
+
+    lemmas = synthetic_lemmas(150000)
+    index = wordlist.PrefixIndex.from_lemmas(lemmas)
+    snapshot = os.path.join(directory, "wordlist.bin")
+    wordlist.save_snapshot(snapshot, "benchmark", index)
+    spelling = wordlist.SpellingIndex.build(index)
+    prefixes = [lemma[:length] for lemma in lemmas[::5000] for length in (1, 2, 4)]
+    typos = [lemma[:2] + lemma[3:] for lemma in lemmas[::5000] if len(lemma) > 4]
+
+    settings = Settings.get()
+    settings.save_settings()
+
+    return [
+        ("clean_search_terms", each(base.clean_search_terms)),
+        ("get_definition (uncached)", uncached_definitions),
+        ("get_definition (cached)", each(base.get_definition, wn_instance)),
+        ("get_data (no pronunciation)", each(base.get_data, wn_instance, "us", False)),
+        ("get_data (cached pronunciation)", each(base.get_data, wn_instance, "us", True)),
+        ("process_result", lambda: [base.process_result(result, "green", "blue") for result in results]),
+        ("PrefixIndex.from_lemmas (150k)", lambda: wordlist.PrefixIndex.from_lemmas(lemmas)),
+        ("load_snapshot (150k)", lambda: wordlist.load_snapshot(snapshot, "benchmark")),
+        ("PrefixIndex.complete", lambda: [index.complete(prefix, 10) for prefix in prefixes]),
+        ("SpellingIndex.suggest", lambda: [spelling.suggest(typo) for typo in typos]),
+        ("Settings.load_settings", settings.load_settings),
+        ("Settings.save_settings", settings.save_settings),
+    ]
+
+
+def summarize(name, timings):
+    """Summarize the timings of a benchmark."""
+    return {
+        "name": name,
+        "rounds": len(timings),
+        "min_us": min(timings),
+        "median_us": statistics.median(timings),
+        "mean_us": statistics.fmean(timings),
+        "stdev_us": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print the change of each median against a baseline run. Return the names of regressed benchmarks."""
+    with open(baseline_path, "r") as baseline_file:
+        baseline = {result["name"]: result for result in json.load(baseline_file)["results"]}
+    regressions = []
+    print(f"\nCompared to {baseline_path}:")
+    for result in results:
+        before = baseline.get(result["name"])
+        if before is None:
+            continue
+        change = result["median_us"] / before["median_us"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"  {result['name']:<36} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains TEXT")
+    parser.add_argument("--json", help="write the results as JSON to PATH")
+    parser.add_argument("--compare", help="compare the medians against an earlier JSON run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown counted as a regression")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend on each benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="wordbook-benchmarks-") as directory:
+        wn_instance = setup_environment(directory)
+        results = []
+        print(f"{'benchmark':<36} {'rounds':>7} {'min us':>11} {'median us':>11} {'stdev us':>11}")
+        for name, function in define_benchmarks(wn_instance, directory):
+            if args.filter not in name:
+                continue
+            result = summarize(name, measure(function, args.min_time))
+            results.append(result)
+            print(
+                f"{name:<36} {result['rounds']:>7} {result['min_us']:>11.1f} {result['median_us']:>11.1f} "
+                f"{result['stdev_us']:>11.1f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(
+                {"python": platform.python_version(), "machine": platform.machine(), "results": results},
+                json_file,
+                indent=2,
+            )
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests of the headless lookup mode."""
+
+from wordbook import batch
+
+
+def test_failed_lookup_record_is_keyed_like_found_ones(monkeypatch):
+    def look_up(term, wn_instance, accent, pronounce):
+        if term == "broken":
+            raise RuntimeError("database is locked")
+        return {"query": term, "found": True}
+
+    monkeypatch.setattr(batch, "look_up", look_up)
+    records = list(batch.look_up_all(["word", "broken", "other"], None, workers=2))
+
+    assert [record["query"] for record in records] == ["word", "broken", "other"]
+    assert records[1] == {"query": "broken", "found": False, "error": "database is locked"}
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests of the local lookup service."""
+
+import pytest
+
+from wordbook import base, server
+from wordbook.wordlist import PrefixIndex
+
+
+class NoCustomDefinitions:
+    def complete(self, prefix, limit=10):
+        return []
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(base, "CDEF_INDEX", NoCustomDefinitions())
+    service = server.LookupService.__new__(server.LookupService)
+    service.wordlist = {"index": PrefixIndex.from_lemmas(f"word{number:03}" for number in range(200))}
+    return service
+
+
+def test_complete_caps_limit(service):
+    assert len(service.complete({"q": "word", "limit": "1000"})["completions"]) == server.MAX_COMPLETIONS
+    assert len(service.complete({"q": "word", "limit": "3"})["completions"]) == 3
+
+
+@pytest.mark.parametrize("limit", ["0", "-5", "ten", "2.5"])
+def test_complete_rejects_invalid_limit(service, limit):
+    with pytest.raises(ValueError):
+        service.complete({"q": "word", "limit": limit})
@@ -8,40 +8,63 @@ base contains the shared code between the GTK+ 3 UI and other possible frontends
 base is a part of Wordbook.
 """
 
-import difflib
 import html
-import json
 import os
-import subprocess
 import sys
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
 from functools import lru_cache
-from shutil import rmtree
-from typing import Callable, Dict, List
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
 
-import wn
-from wn import Form, Wordnet
+from wordbook import profiling, pronunciation, tracing, utils, wordlist
+from wordbook.cache import LRUCache
+from wordbook.cdef import CustomDefinitionIndex, CustomDefinitionStore
+from wordbook.history import HistoryStore
+from wordbook.lookup import LookupEngine
+from wordbook.pronunciation import PronunciationStore
+from wordbook.speech import SpeechEngine
+from wordbook.tasks import SCHEDULER, Priority
+from wordbook.wordlist import PrefixIndex, SpellingIndex
 
-from wordbook import utils
+if TYPE_CHECKING:
+    from wn import Wordnet
+
+# wn, difflib and subprocess take long to import and are only needed for actual lookups, so they are imported on
+# first use. See benchmarks/import_time.py.
 
-POOL = ThreadPoolExecutor()
 WN_DB_VERSION = "oewn:2022"
-wn.config.data_directory = os.path.join(utils.WN_DIR)
-wn.config.allow_multithreading = True
+DEFINITION_CACHE = LRUCache(maxsize=256)
+CDEF_INDEX = CustomDefinitionIndex(utils.CDEF_DIR, CustomDefinitionStore(utils.CDEF_FILE))
+PRONUNCIATION_STORE = PronunciationStore(utils.PRONUNCIATIONS_FILE)
+HISTORY_STORE = HistoryStore(utils.HISTORY_FILE)
+SPEECH_ENGINE = SpeechEngine()
+LOOKUP_ENGINE = LookupEngine(os.path.join(utils.WN_DIR, "wn.db"), WN_DB_VERSION)
 
 
-def _threadpool(func):
+def _scheduled(priority: Priority):
     """
-    Wraps around a function allowing it to run in a separate thread and
-    return a future object.
+    Wraps around a function allowing it to run on the task scheduler at the given
+    priority and return a future object.
     """
 
-    def wrap(*args, **kwargs):
-        return (POOL).submit(func, *args, **kwargs)
+    def decorator(func):
+        def wrap(*args, **kwargs):
+            return SCHEDULER.submit(priority, func, *args, **kwargs)
+
+        return wrap
+
+    return decorator
+
 
-    return wrap
+def import_wn():
+    """Import and configure python-wn."""
+    import wn
 
+    wn.config.data_directory = utils.WN_DIR
+    wn.config.allow_multithreading = True
+    return wn
 
+
+@tracing.traced("clean_search_terms")
 def clean_search_terms(search_term):
     """Clean up search terms."""
     text = search_term.strip().strip('<>"-?`![](){}/:;,*')
@@ -57,15 +80,28 @@ def create_required_dirs():
     os.makedirs(utils.CDEF_DIR, exist_ok=True)  # create Custom Definitions folder.
 
 
-def fetch_definition(text, wordcol, sencol, wn_instance, cdef=True, accent="us"):
+def fetch_definition(text, wordcol, sencol, wn_instance, cdef=True, accent="us", pronounce=True):
     """Check if custom definition exists."""
-    if cdef and os.path.isfile(f"{utils.CDEF_DIR}/{text.lower()}"):
-        return get_custom_def(text, wordcol, sencol, wn_instance, accent)
-    return get_data(text, wordcol, sencol, wn_instance, accent)
+    if cdef and text in CDEF_INDEX:
+        return get_custom_def(text, wordcol, sencol, wn_instance, accent, pronounce)
+    return get_data(text, wn_instance, accent, pronounce)
+
+
+def get_colors(dark_font):
+    """Return the word and sentence colors for the given theme."""
+    if dark_font:
+        sencol = "cyan"  # Color of sentences in Dark mode
+        wordcol = "lightgreen"  # Color of: Similar words, Synonyms and Antonyms.
+    else:
+        sencol = "blue"  # Color of sentences in regular
+        wordcol = "green"  # Color of: Similar words, Synonyms, Antonyms.
+    return wordcol, sencol
 
 
 def get_cowfortune():
     """Present cowsay version of fortune easter egg."""
+    import subprocess
+
     try:
         cowsaid: str = (
             subprocess.Popen(
@@ -85,37 +121,47 @@ def get_cowfortune():
         return f"<tt>{fortune_out}</tt>"
 
 
-def get_custom_def(text: str, wordcol: str, sencol: str, wn_instance, accent="us"):
+def get_custom_def(text: str, wordcol: str, sencol: str, wn_instance, accent="us", pronounce=True):
     """Present custom definition when available."""
-    with open(f"{utils.CDEF_DIR}/{text}", "r") as def_file:
-        custom_def_dict: dict = json.load(def_file)
+    custom_def_dict = CDEF_INDEX.get(text)
+    if custom_def_dict is None:
+        return get_data(text, wn_instance, accent, pronounce)
     if "linkto" in custom_def_dict:
-        return get_data(custom_def_dict.get("linkto", text), wordcol, sencol, wn_instance, accent)
-    definition = custom_def_dict.get(
-        "out_string",
-        get_definition(text, wordcol, sencol, wn_instance)[0]["out_string"],
-    )
-    definition = definition.format(WORDCOL=wordcol, SENCOL=sencol)
+        return get_data(custom_def_dict.get("linkto", text), wn_instance, accent, pronounce)
+    if "out_string" in custom_def_dict:
+        definition = custom_def_dict["out_string"].format(WORDCOL=wordcol, SENCOL=sencol)
+        result = None
+    else:
+        definition = None
+        result = get_definition(text, wn_instance)[0]["result"]
     term = custom_def_dict.get("term", text)
-    pronunciation = custom_def_dict.get("pronunciation", get_pronunciation(term, accent)) or "Is espeak-ng installed?"
+    if "pronunciation" in custom_def_dict:
+        pronunciation = custom_def_dict["pronunciation"] or "Is espeak-ng installed?"
+    else:
+        pronunciation = get_final_pronunciation(term, accent) if pronounce else None
     final_data = {
         "term": term,
         "pronunciation": pronunciation,
+        "result": result,
         "out_string": definition,
     }
     return final_data
 
 
-def get_data(term, word_col, sen_col, wn_instance, accent="us"):
-    """Obtain the data to be processed and presented."""
+def get_data(term, wn_instance, accent="us", pronounce=True):
+    """
+    Obtain the data to be processed and presented.
+
+    If pronounce is False, the pronunciation is left as None for the caller to fill in later through
+    get_final_pronunciation, so that the definition can be presented without waiting for espeak-ng.
+    """
 
     # Obtain definition from given parameters
-    definition = get_definition(term, word_col, sen_col, wn_instance)
+    definition = get_definition(term, wn_instance)
     clean_def = definition[0]
 
     # Get pronunciation of the term or default to the original term if no pronunciation available.
-    pron = get_pronunciation(clean_def["term"] or term, accent)
-    final_pron = pron if pron and not pron.isspace() else "Is espeak-ng installed?"
+    final_pron = get_final_pronunciation(clean_def["term"] or term, accent) if pronounce else None
 
     # Create the dictionary to be returned.
     final_data = {
@@ -128,10 +174,38 @@ def get_data(term, word_col, sen_col, wn_instance, accent="us"):
     return final_data
 
 
-def get_definition(term: str, word_col: str, sen_col: str, wn_instance):
-    """Get the definition from python-wn and process it."""
+@tracing.traced("get_definition")
+@profiling.measure_allocations("get_definition")
+def get_definition(term: str, wn_instance):
+    """
+    Get the definition from python-wn and process it.
+
+    Results are cached by normalized term and lexicon, and are free of colors so that they can be rendered in any
+    theme. They are shared between callers and must not be modified.
+    """
+    cache_key = (term.strip().casefold(), WN_DB_VERSION)
+    cached = DEFINITION_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    definition = _get_definition(term, wn_instance)
+    DEFINITION_CACHE.put(cache_key, definition)
+    return definition
+
+
+@tracing.traced("get_definition.wordnet")
+def _get_definition(term: str, wn_instance):
+    """
+    Query python-wn for the definition of term.
+
+    python-wn only matches term to its synsets. Everything shown for them is fetched by LOOKUP_ENGINE in a few
+    set-based queries, instead of a handful of ORM queries for every synset and sense.
+    """
+    from difflib import get_close_matches
+
     result_dict = None
     synsets = wn_instance.synsets(term)  # Get relevant synsets.
+    details = LOOKUP_ENGINE.fetch([synset.id for synset in synsets])
 
     if synsets:
         # Synsets have 'parts of speech'. We need their real names.
@@ -160,8 +234,6 @@ def get_definition(term: str, word_col: str, sen_col: str, wn_instance):
             "adposition": [],
             "other": [],
             "unknown": [],
-            "word_col": word_col,
-            "sen_col": sen_col,
         }
         first_match = None
         for synset in synsets:
@@ -169,8 +241,9 @@ def get_definition(term: str, word_col: str, sen_col: str, wn_instance):
             pos = actual_pos[synset.pos]  # If this fails, nothing beyond it is useful.
 
             # We need the term as is found in the WordNet database.
-            lemma_names = synset.lemmas()
-            diff_match = difflib.get_close_matches(term, lemma_names)
+            synset_details = details[synset.id]
+            lemma_names = synset_details["lemmas"]
+            diff_match = get_close_matches(term, lemma_names)
             synset_name = diff_match[0].strip() if diff_match else lemma_names[0]
 
             # If suitable term isn't found, return the term entered.
@@ -178,32 +251,19 @@ def get_definition(term: str, word_col: str, sen_col: str, wn_instance):
                 first_match = synset_name
 
             syn = []  # Synonyms
-            ant = []  # Antonyms
-            for lemma in synset.lemmas():
+            for lemma in lemma_names:
                 syn_name = lemma.replace("_", " ").strip()
                 if not syn_name == first_match:
                     syn.append(syn_name)
-            for sense in synset.senses():
-                for ant_sense in sense.get_related("antonym"):
-                    ant_name = ant_sense.word().lemma()
-                    ant.append(ant_name)
-
-            sims = []  # WordNet's "Similar to"
-            for sim_synset in synset.get_related("similar"):
-                sims.extend(sim_synset.lemmas())
-
-            also_sees = []  # WorNet's "Also See"
-            for also_synset in synset.get_related("also"):
-                also_sees.extend(also_synset.lemmas())
 
             synset_dict = {
                 "name": synset_name,
-                "definition": synset.definition(),
-                "examples": synset.examples(),
+                "definition": synset_details["definition"],
+                "examples": synset_details["examples"],
                 "syn": syn,
-                "ant": ant,
-                "sim": sims,
-                "also_sees": also_sees,
+                "ant": synset_details["antonyms"],  # Antonyms
+                "sim": synset_details["similar"],  # WordNet's "Similar to"
+                "also_sees": synset_details["also"],  # WordNet's "Also See"
             }
 
             # Get the definition for each synset.
@@ -224,8 +284,17 @@ def get_definition(term: str, word_col: str, sen_col: str, wn_instance):
     return (clean_def, False)
 
 
+@tracing.traced("get_pronunciation")
+def get_final_pronunciation(term, accent="us"):
+    """Get the pronunciation to present for term."""
+    pron = get_pronunciation(term, accent)
+    return pron if pron and not pron.isspace() else "Is espeak-ng installed?"
+
+
 def get_fortune(mono=True):
     """Present fortune easter egg."""
+    import subprocess
+
     try:
         fortune_output = (
             subprocess.Popen(["fortune", "-a"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -244,22 +313,24 @@ def get_fortune(mono=True):
 
 @lru_cache(maxsize=128)
 def get_pronunciation(term, accent="us"):
-    """Get the pronunciation from espeak and process it."""
-    pron_output = (
-        subprocess.Popen(
-            ["espeak-ng", "-v", f"en-{accent}", "--ipa", "-q", term],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        .communicate()[0]
-        .decode()
-    )
-    clean_output = " /{0}/".format(pron_output.strip().replace("\n ", " "))
+    """Get the pronunciation from the pronunciation store or espeak and process it."""
+    version = pronunciation.get_espeak_version()
+    if version is not None:
+        stored = PRONUNCIATION_STORE.get(term, accent, version)
+        if stored is not None:
+            return stored
+
+    with tracing.TRACER.span("get_pronunciation.espeak", term):
+        clean_output = SPEECH_ENGINE.transcribe(term, accent)
+    if version is not None and clean_output.strip("/ "):
+        PRONUNCIATION_STORE.put_many([(term, accent, version, clean_output)])
     return clean_output
 
 
 def get_version_info(version):
     """Present clear version info."""
+    import subprocess
+
     print(f"Wordbook - {version}")
     print("Copyright 2016-2024 Mufeed Ali")
     print()
@@ -274,29 +345,72 @@ def get_version_info(version):
         print(f"You're missing a few dependencies. (espeak-ng)\n{str(ex)}")
 
 
-@_threadpool
-def get_wn_file(reloader: Callable) -> Dict[str, Wordnet | List[Form]]:
-    """Get the WordNet wordlist according to WordNet version."""
+@_scheduled(Priority.INTERACTIVE)
+def get_wn_instance(reloader: Callable) -> "Wordnet | None":
+    """Open the WordNet database according to WordNet version."""
     utils.log_info("Initializing WordNet.")
+    wn = import_wn()
     try:
-        wn_instance: Wordnet = Wordnet(lexicon=WN_DB_VERSION)
+        wn_instance: Wordnet = wn.Wordnet(lexicon=WN_DB_VERSION)
     except (wn.Error, wn.DatabaseError):
         utils.log_info("The WordNet database is either corrupted or is of an older version.")
         return reloader()
-    utils.log_info("Fetching WordNet, wordlist.")
-    wn_file = [w.lemma() for w in wn_instance.words()]
-    utils.log_info("WordNet is ready.")
-    return {"instance": wn_instance, "list": wn_file}
+    utils.log_info("WordNet is ready for lookups.")
+    return wn_instance
 
 
-def format_output(text, dark_font, wn_instance, cdef, accent="us"):
+@_scheduled(Priority.COMPLETION)
+@profiling.measure_allocations("get_wn_file")
+def get_wn_file(wn_future: Future) -> Dict[str, Sequence[str] | PrefixIndex] | None:
+    """Get the WordNet wordlist according to WordNet version."""
+    utils.log_info("Fetching WordNet, wordlist.")
+    stamp = get_wordlist_stamp()
+    wn_index = wordlist.load_snapshot(utils.WORDLIST_FILE, stamp)
+    if wn_index is None:
+        wn_instance = wn_future.result()
+        if wn_instance is None:
+            return None
+        utils.log_info("Building wordlist snapshot.")
+        wn_index = PrefixIndex.from_lemmas(w.lemma() for w in wn_instance.words())
+        try:
+            wordlist.save_snapshot(utils.WORDLIST_FILE, stamp, wn_index)
+        except OSError:
+            utils.log_warning("Failed to save the wordlist snapshot.")
+    utils.log_info("WordNet wordlist is ready.")
+    return {"list": wn_index.words, "index": wn_index}
+
+
+def get_spelling_index(wordlist_future: Future) -> Future:
+    """Get the index used to suggest words for failed searches, once the wordlist is ready."""
+    return SCHEDULER.submit(Priority.PREFETCH, _get_spelling_index, wordlist_future, after=wordlist_future)
+
+
+def _get_spelling_index(wordlist_future: Future) -> SpellingIndex | None:
+    wn_file = wordlist_future.result()
+    if wn_file is None:
+        return None
+    stamp = get_wordlist_stamp()
+    spelling_index = wordlist.load_spelling_snapshot(utils.SPELLING_FILE, stamp, wn_file["index"])
+    if spelling_index is None:
+        utils.log_info("Building spelling index snapshot.")
+        spelling_index = SpellingIndex.build(wn_file["index"])
+        try:
+            wordlist.save_spelling_snapshot(utils.SPELLING_FILE, stamp, spelling_index)
+        except OSError:
+            utils.log_warning("Failed to save the spelling index snapshot.")
+    utils.log_info("Spelling suggestions are ready.")
+    return spelling_index
+
+
+def get_wordlist_stamp() -> str:
+    """Identify the WordNet database a wordlist snapshot is built from."""
+    db_stat = os.stat(os.path.join(utils.WN_DIR, "wn.db"))
+    return f"{WN_DB_VERSION}:{db_stat.st_mtime_ns}:{db_stat.st_size}"
+
+
+def format_output(text, dark_font, wn_instance, cdef, accent="us", pronounce=True):
     """Return appropriate definitions."""
-    if dark_font:
-        sencol = "cyan"  # Color of sentences in Dark mode
-        wordcol = "lightgreen"  # Color of: Similar words, Synonyms and Antonyms.
-    else:
-        sencol = "blue"  # Color of sentences in regular
-        wordcol = "green"  # Color of: Similar words, Synonyms, Antonyms.
+    wordcol, sencol = get_colors(dark_font)
     if text == "fortune -a":
         return {
             "term": "<tt>Some random adage</tt>",
@@ -312,18 +426,71 @@ def format_output(text, dark_font, wn_instance, cdef, accent="us"):
     if text in ("crash now", "close now"):
         return sys.exit()
     if text and not text.isspace():
-        return fetch_definition(text, wordcol, sencol, wn_instance, cdef=cdef, accent=accent)
+        return fetch_definition(text, wordcol, sencol, wn_instance, cdef=cdef, accent=accent, pronounce=pronounce)
     return None
 
 
+@tracing.traced("process_result")
+def process_result(result: dict, word_col: str, sen_col: str) -> str:
+    """Render the results of get_definition as Pango markup in the given colors."""
+    return "\n\n".join(
+        heading + "".join("\n  " + synset.replace("\n", "\n  ") for synset in synsets)
+        for heading, synsets in process_result_sections(result, word_col, sen_col)
+    )
+
+
+def process_result_sections(result: dict, word_col: str, sen_col: str) -> List[Tuple[str, List[str]]]:
+    """
+    Render the results of get_definition as Pango markup in the given colors, for the definition list.
+
+    Returns a (heading, synsets) pair for each run of synsets with the same name and part of speech, with the markup
+    of each synset.
+    """
+    sections = []
+    for pos, synsets in result.items():
+        orig_synset = None
+        for synset in sorted(synsets, key=lambda k: k["name"]):
+            if synset["name"] != orig_synset:
+                orig_synset = synset["name"]
+                section = []
+                sections.append((f"{orig_synset} ~ <b>{pos}</b>", section))
+            section.append(process_synset(synset, len(section) + 1, word_col, sen_col))
+    return sections
+
+
+def process_synset(synset: dict, number: int, word_col: str, sen_col: str) -> str:
+    """Render a synset of the results of get_definition as Pango markup."""
+    lines = [f'<b>{number}</b>: {synset["definition"]}']
+    for example in synset["examples"]:
+        lines.append(f'      <span foreground="{sen_col}">{example}</span>')
+    for label, key in (("Synonyms", "syn"), ("Antonyms", "ant"), ("Similar to", "sim"), ("Also see", "also_sees")):
+        links = process_word_links(synset[key], word_col)
+        if links:
+            lines.append(f"      {label}:<i> {links}</i>")
+    return "\n".join(lines)
+
+
+def process_word_links(word_list, word_col):
+    """Process word links like synonyms, antonyms, etc."""
+    pretty_list = []
+    for word in word_list:
+        pretty_list.append(f'<span foreground="{word_col}">' f'<a href="search;{word}">{word}</a>' "</span>")
+    if pretty_list:
+        pretty_list = ", ".join(pretty_list)
+        return pretty_list
+    return ""
+
+
 def read_term(text, speed=120, accent="us"):
-    """Say text loudly."""
-    with open(os.devnull, "w") as null_maker:
-        subprocess.Popen(
-            ["espeak-ng", "-s", speed, "-v", f"en-{accent}", text],
-            stdout=null_maker,
-            stderr=subprocess.STDOUT,
-        )
+    """Say text loudly, without waiting for espeak-ng."""
+
+    def log_failure(future):
+        if future.exception() is not None:
+            utils.log_warning(f"Failed to read {text!r} aloud: {future.exception()}")
+
+    future = SPEECH_ENGINE.speak(text, speed, accent)
+    future.add_done_callback(log_failure)
+    return future
 
 
 class WordnetDownloader:
@@ -337,6 +504,9 @@ class WordnetDownloader:
     @staticmethod
     def download(progress_handler=None):
         """Download the Wordnet database."""
+        from shutil import rmtree
+
+        wn = import_wn()
         if os.path.isdir(os.path.join(utils.WN_DIR, "downloads")):
             rmtree(os.path.join(utils.WN_DIR, "downloads"))
         wn.download(WN_DB_VERSION, progress_handler=progress_handler)
@@ -345,3 +515,4 @@ class WordnetDownloader:
     def delete_db():
         """Delete the Wordnet database."""
         os.remove(os.path.join(utils.WN_DIR, "wn.db"))
+        LOOKUP_ENGINE.reset()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+batch contains the headless lookup mode, which streams definitions for a list of terms as JSON lines.
+
+batch is a part of Wordbook.
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, TextIO
+
+from wordbook import base, utils
+
+
+def read_terms(source: TextIO) -> Iterator[str]:
+    """Yield the terms of a list with one term per line, skipping blank lines."""
+    for line in source:
+        term = base.clean_search_terms(line)
+        if term:
+            yield term
+
+
+def look_up(term: str, wn_instance, accent="us", pronounce=True) -> dict:
+    """Look up a term as the window would, and return a JSON serializable record for it."""
+    wordcol, sencol = base.get_colors(False)
+    data = base.fetch_definition(term, wordcol, sencol, wn_instance, accent=accent, pronounce=pronounce)
+    return {"query": term, "found": data["result"] is not None or data["out_string"] is not None, **data}
+
+
+def look_up_all(
+    terms: Iterable[str], wn_instance, workers: int | None = None, accent="us", pronounce=True
+) -> Iterator[dict]:
+    """
+    Look up terms on a pool of workers and yield their records in input order.
+
+    Only a few lookups per worker are in flight at once, so terms are read lazily and memory use does not grow with
+    the length of the input. A term whose lookup fails gets an error record, and the batch goes on.
+    """
+    workers = workers or os.cpu_count() or 1
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Batch") as pool:
+        for term in terms:
+            in_flight.append((term, pool.submit(look_up, term, wn_instance, accent, pronounce)))
+            if len(in_flight) >= workers * 4:
+                yield _result(*in_flight.popleft())
+        while in_flight:
+            yield _result(*in_flight.popleft())
+
+
+def _result(term: str, future: Future) -> dict:
+    try:
+        return future.result()
+    except Exception as ex:  # Report the failure in the output instead of ending the batch.
+        utils.log_error(f"Failed to look up {term!r}: {ex}")
+        return {"query": term, "found": False, "error": str(ex) or type(ex).__name__}
+
+
+def run(path: str, output: TextIO = sys.stdout, workers: int | None = None, accent="us", pronounce=True) -> int:
+    """Write a JSON line for each term listed in the file at path, or stdin if path is "-". Returns an exit status."""
+    wn = base.import_wn()
+    wn_instance = None
+    if base.WordnetDownloader.check_status():
+        try:
+            wn_instance = wn.Wordnet(lexicon=base.WN_DB_VERSION)
+        except (wn.Error, wn.DatabaseError):
+            pass
+    if wn_instance is None:
+        print("WordNet is not available. Start Wordbook once to download it.", file=sys.stderr)
+        return 1
+
+    count = 0
+    try:
+        source = sys.stdin if path == "-" else open(path, "r")
+    except OSError as ex:
+        print(f"Failed to read {path}: {ex}", file=sys.stderr)
+        return 1
+    with source:
+        for record in look_up_all(read_terms(source), wn_instance, workers, accent, pronounce):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    output.flush()
+    utils.log_info(f"Looked up {count} terms.")
+    return 0
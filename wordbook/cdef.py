@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+cdef contains the custom definitions store and its in-memory index.
+
+cdef is a part of Wordbook.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from html import escape
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from wordbook import utils
+from wordbook.tasks import SCHEDULER, Priority
+from wordbook.wordlist import PrefixIndex
+
+DIRECTORY_SOURCE = "directory"  # Entries mirrored from the custom definitions folder.
+IMPORT_SOURCE = "import"  # Entries imported from glossaries.
+STAMP_DELAY = 2.0  # Seconds without changes to the folder before its stamp is saved.
+
+
+def check_definition(name, custom_def_dict, where: str) -> Tuple[str, dict]:
+    """Check that a definition has a name and is an object, raising ValueError if not."""
+    if not isinstance(name, str) or not name:
+        raise ValueError(f"{where}: Definition has no name or term.")
+    if not isinstance(custom_def_dict, dict):
+        raise ValueError(f"{where}: Definition of {name!r} is not an object.")
+    return name, custom_def_dict
+
+
+def directory_stamp(path: str) -> str:
+    """
+    Identify the state of the custom definitions folder by the name, modification time and size of each file.
+
+    Editing a file in place does not change the modification time of the folder, so the folder's own is not enough.
+    """
+    files = sorted(
+        f"{entry.name}\0{entry.stat().st_mtime_ns}\0{entry.stat().st_size}"
+        for entry in os.scandir(path)
+        if entry.is_file()
+    )
+    return hashlib.sha1("\n".join(files).encode()).hexdigest()
+
+
+def read_definition_file(path: str) -> dict:
+    """Read a single custom definition file."""
+    with open(path, "r") as def_file:
+        return check_definition(os.path.basename(path), json.load(def_file), path)[1]
+
+
+def read_glossary(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Read (name, definition) pairs from a glossary.
+
+    A glossary is either a folder of custom definition files, a .json file holding an object that maps names to
+    definitions, or a JSON-lines file with one definition per line, named by its "name" or "term" key. JSON-lines
+    files are streamed.
+    """
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            if entry.is_file():
+                try:
+                    yield entry.name, read_definition_file(entry.path)
+                except (OSError, ValueError):
+                    utils.log_warning(f"Skipping unreadable custom definition {entry.path}.")
+        return
+
+    with open(path, "r") as glossary_file:
+        if path.endswith(".json"):
+            glossary = json.load(glossary_file)
+            if not isinstance(glossary, dict):
+                raise ValueError(f"{path}: Glossary is not an object mapping names to definitions.")
+            for name, custom_def_dict in glossary.items():
+                yield check_definition(name, custom_def_dict, path)
+            return
+        for line_number, line in enumerate(glossary_file, 1):
+            if not line.strip():
+                continue
+            custom_def_dict = json.loads(line)
+            if not isinstance(custom_def_dict, dict):
+                raise ValueError(f"{path}:{line_number}: Definition is not an object.")
+            name = custom_def_dict.pop("name", None) or custom_def_dict.get("term")
+            yield check_definition(name, custom_def_dict, f"{path}:{line_number}")
+
+
+class CustomDefinitionStore:
+    """Stores custom definitions in a single SQLite database, indexed by casefolded name."""
+
+    def __init__(self, path: str):
+        """Initialize the store. The database is opened on first use."""
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(
+                "CREATE TABLE IF NOT EXISTS definitions ("
+                "key TEXT PRIMARY KEY, name TEXT NOT NULL, source TEXT NOT NULL, data TEXT NOT NULL) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;"
+            )
+        return self._connection
+
+    def export(self, path: str) -> int:
+        """Export every custom definition to a JSON-lines glossary."""
+        count = 0
+        with self._lock:
+            rows = self._connect().execute("SELECT name, data FROM definitions ORDER BY key").fetchall()
+        with open(f"{path}.tmp", "w") as glossary_file:
+            for name, data in rows:
+                glossary_file.write(json.dumps({"name": name, **json.loads(data)}, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(f"{path}.tmp", path)
+        return count
+
+    def get(self, text: str) -> dict | None:
+        """Get the custom definition for text."""
+        with self._lock:
+            row = self._connect().execute("SELECT data FROM definitions WHERE key = ?", (text.casefold(),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def import_glossary(self, path: str) -> int:
+        """Import every definition from a glossary in one transaction. Returns the number of definitions."""
+        return self.put_many(read_glossary(path), IMPORT_SOURCE)
+
+    def names(self) -> List[str]:
+        """Get the names of every custom definition."""
+        with self._lock:
+            return [row[0] for row in self._connect().execute("SELECT name FROM definitions")]
+
+    def put_many(self, entries: Iterable[Tuple[str, dict]], source: str) -> int:
+        """Store (name, definition) pairs in one transaction. Returns the number of definitions."""
+        rows = ((name.casefold(), name, source, json.dumps(data)) for name, data in entries)
+        with self._lock, self._connect() as connection:
+            cursor = connection.executemany("INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?)", rows)
+            return cursor.rowcount
+
+    def remove(self, name: str, source: str):
+        """Remove the custom definition called name if it came from source."""
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM definitions WHERE key = ? AND source = ?", (name.casefold(), source))
+
+    def save_directory_stamp(self, path: str):
+        """Record that the store mirrors the current state of the custom definitions folder."""
+        try:
+            stamp = directory_stamp(path)
+        except OSError:
+            return
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('directory_stamp', ?)", (stamp,))
+
+    def sync_directory(self, path: str) -> bool:
+        """
+        Mirror the custom definitions folder into the store if it changed since it was last mirrored.
+
+        Returns whether anything was imported.
+        """
+        try:
+            stamp = directory_stamp(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = 'directory_stamp'").fetchone()
+        if row and row[0] == stamp:
+            return False
+
+        utils.log_info("Importing the custom definitions folder.")
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM definitions WHERE source = ?", (DIRECTORY_SOURCE,))
+            connection.executemany(
+                "INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?)",
+                ((name.casefold(), name, DIRECTORY_SOURCE, json.dumps(data)) for name, data in read_glossary(path)),
+            )
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('directory_stamp', ?)", (stamp,))
+        return True
+
+
+class CustomDefinitionIndex:
+    """
+    Keeps the names of the stored custom definitions in memory, and parses definitions on demand.
+
+    The custom definitions folder is mirrored into the store on first use. Afterwards, the owner of the index is
+    expected to report changes to the folder through add() and remove(), for example from a file monitor, off the
+    main thread. The stamp of the folder is saved once it has not changed for STAMP_DELAY seconds, since computing it
+    reads the state of every file.
+    """
+
+    def __init__(self, path: str, store: CustomDefinitionStore):
+        """Initialize the index for the custom definitions folder at path."""
+        self.path = path
+        self.store = store
+        self._names: Dict[str, str] | None = None  # Casefolded names to names.
+        self._parsed: Dict[str, dict] = {}
+        self._completion: PrefixIndex | None = None
+        self._lock = threading.RLock()
+
+    def __contains__(self, text: str) -> bool:
+        return text.casefold() in self._get_names()
+
+    def _get_names(self) -> Dict[str, str]:
+        with self._lock:
+            if self._names is None:
+                self.refresh()
+            return self._names
+
+    def add(self, name: str):
+        """Add or update the custom definition stored in the file name of the custom definitions folder."""
+        try:
+            custom_def_dict = read_definition_file(os.path.join(self.path, name))
+        except (OSError, ValueError):
+            utils.log_warning(f"Failed to read the custom definition for {name}.")
+            return
+        self.store.put_many([(name, custom_def_dict)], DIRECTORY_SOURCE)
+        self._save_stamp_later()
+        with self._lock:
+            self._get_names()[name.casefold()] = name
+            self._parsed[name.casefold()] = custom_def_dict
+            self._completion = None
+
+    def _save_stamp_later(self):
+        SCHEDULER.submit(
+            Priority.BACKGROUND,
+            self.store.save_directory_stamp,
+            self.path,
+            key=("cdef-stamp", self.path),
+            delay=STAMP_DELAY,
+        )
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Return up to limit custom definition names starting with prefix."""
+        with self._lock:
+            if self._completion is None:
+                self._completion = PrefixIndex.from_lemmas(escape(name) for name in self._get_names().values())
+            completion = self._completion
+        return completion.complete(prefix, limit)
+
+    def get(self, text: str) -> dict | None:
+        """Get the custom definition for text, or None if there is none."""
+        key = text.casefold()
+        if key not in self._get_names():
+            return None
+        with self._lock:
+            if key in self._parsed:
+                return self._parsed[key]
+        try:
+            custom_def_dict = self.store.get(key)
+        except (sqlite3.Error, ValueError):
+            utils.log_warning(f"Failed to read the custom definition for {text}.")
+            return None
+        with self._lock:
+            self._parsed[key] = custom_def_dict
+        return custom_def_dict
+
+    def refresh(self):
+        """Mirror the custom definitions folder and load the names from the store again."""
+        try:
+            self.store.sync_directory(self.path)
+            names = self.store.names()
+        except (sqlite3.Error, OSError):
+            utils.log_warning("Failed to load custom definitions.")
+            names = []
+        with self._lock:
+            self._names = {name.casefold(): name for name in names}
+            self._parsed.clear()
+            self._completion = None
+
+    def remove(self, name: str):
+        """Remove the custom definition stored in the file name of the custom definitions folder."""
+        self.store.remove(name, DIRECTORY_SOURCE)
+        self._save_stamp_later()
+        if self.store.get(name) is not None:
+            return  # An imported definition of the same name remains.
+        with self._lock:
+            names = self._get_names()
+            if names.get(name.casefold()) == name:
+                del names[name.casefold()]
+            self._parsed.pop(name.casefold(), None)
+            self._completion = None
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+history contains the persistent store of searched terms, with how often and when each was looked up.
+
+history is a part of Wordbook.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, NamedTuple
+
+from wordbook import utils
+
+
+class HistoryEntry(NamedTuple):
+    term: str
+    count: int
+    first_seen: float
+    last_seen: float
+
+
+class HistoryStore:
+    """
+    Persistent, unbounded search history keyed by term.
+
+    Each lookup updates a single row, so that recording one costs the same however long the history is, and the
+    history is read a page at a time, most recent first, or searched by prefix, most frequent first.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the store. The database is opened on first use."""
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "term TEXT NOT NULL PRIMARY KEY, count INTEGER NOT NULL, first_seen REAL NOT NULL, "
+                "last_seen REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS history_last_seen ON history (last_seen)")
+        return self._connection
+
+    def add(self, term: str, when: float | None = None):
+        """Record a lookup of term."""
+        when = time.time() if when is None else when
+        try:
+            with self._lock, self._connect() as connection:
+                connection.execute(
+                    "INSERT INTO history VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT (term) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen",
+                    (term, when, when),
+                )
+        except sqlite3.Error:
+            utils.log_warning("Failed to write to the history store.")
+
+    def import_terms(self, terms: Iterable[str]):
+        """Record one lookup of each term, oldest first, as if looked up in order until now."""
+        terms = list(terms)
+        now = time.time()
+        for age, term in enumerate(reversed(terms)):
+            self.add(term, now - age)
+
+    def get(self, term: str) -> HistoryEntry | None:
+        """Get the history of a term."""
+        rows = self._query("SELECT * FROM history WHERE term = ?", (term,))
+        return rows[0] if rows else None
+
+    def page(self, offset: int, limit: int) -> List[HistoryEntry]:
+        """Get limit terms of the history, most recently looked up first, skipping the first offset ones."""
+        return self._query("SELECT * FROM history ORDER BY last_seen DESC LIMIT ? OFFSET ?", (limit, offset))
+
+    def complete(self, prefix: str, limit: int) -> List[HistoryEntry]:
+        """Get up to limit looked up terms starting with prefix, most frequently looked up first."""
+        return self._query(
+            "SELECT * FROM history WHERE term >= ? AND term < ? ORDER BY count DESC, last_seen DESC LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit),
+        )
+
+    def __len__(self):
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        except sqlite3.Error:
+            utils.log_warning("Failed to read the history store.")
+            return 0
+
+    def _query(self, query: str, parameters: tuple) -> List[HistoryEntry]:
+        try:
+            with self._lock:
+                return [HistoryEntry(*row) for row in self._connect().execute(query, parameters)]
+        except sqlite3.Error:
+            utils.log_warning("Failed to read the history store.")
+            return []
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+lookup contains the batched queries used to fetch everything shown for a set of synsets at once.
+
+lookup is a part of Wordbook.
+"""
+
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, Sequence
+
+# Lemma of an entry: its rank 0 form, as returned by wn's Word.lemma().
+_LEMMA = "(SELECT f.form FROM forms AS f WHERE f.entry_rowid = {entry}.entry_rowid ORDER BY f.rank LIMIT 1)"
+
+
+def _placeholders(values: Sequence) -> str:
+    return ",".join("?" * len(values))
+
+
+class LookupEngine:
+    """
+    Fetches the lemmas, definitions, examples and relations of many synsets in a few set-based queries.
+
+    Each thread gets its own read-only connection to the wn database.
+    """
+
+    def __init__(self, database_path: str, lexicon: str):
+        """Initialize the engine for the lexicon specifier (id:version) in the database at database_path."""
+        self.database_path = database_path
+        self.lexicon = lexicon
+        self._generation = 0
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.generation != self._generation:
+            connection.close()
+            connection = None
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+            lexicon_id, _, version = self.lexicon.partition(":")
+            self._local.lexicons = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT rowid FROM lexicons WHERE id = ? AND (? = '' OR version = ?)",
+                    (lexicon_id, version, version),
+                )
+            ]
+            self._local.connection = connection
+            self._local.generation = self._generation
+        return connection
+
+    def first_glosses(self, words: Sequence[str]) -> Dict[str, str]:
+        """
+        Get the first definition of each word, in one query.
+
+        The first definition is that of the first synset python-wn would list for the word. Words without a
+        definition are left out.
+        """
+        connection = self._connect()
+        lexicons = self._local.lexicons
+        if not words or not lexicons:
+            return {}
+        forms = {form: word for word in words for form in (word, word.replace(" ", "_"))}
+        glosses: Dict[str, str] = {}
+        for form, definition in connection.execute(
+            f"""
+            SELECT f.form,
+                   (SELECT d.definition
+                      FROM senses AS s
+                      JOIN definitions AS d ON d.synset_rowid = s.synset_rowid
+                     WHERE s.entry_rowid = f.entry_rowid
+                     ORDER BY s.entry_rank, d.rowid
+                     LIMIT 1)
+              FROM forms AS f
+             WHERE f.form IN ({_placeholders(forms)}) AND f.rank = 0 AND f.lexicon_rowid IN ({_placeholders(lexicons)})
+             ORDER BY f.entry_rowid
+            """,
+            (*forms, *lexicons),
+        ):
+            if definition is not None:
+                glosses.setdefault(forms[form], definition)
+        return glosses
+
+    def reset(self):
+        """Make every thread reopen its connection, for example after the database was replaced."""
+        self._generation += 1
+
+    def fetch(self, synset_ids: Sequence[str]) -> Dict[str, dict]:
+        """
+        Get the details of the synsets with the given ids.
+
+        Returns a mapping of synset id to a dict with the synset's "lemmas", "definition", "examples" and "antonyms",
+        and the lemmas of its "similar" and "also" related synsets, in the order python-wn would return them.
+        """
+        connection = self._connect()
+        lexicons = self._local.lexicons
+        if not synset_ids or not lexicons:
+            return {}
+        lex = _placeholders(lexicons)
+
+        rowids = dict(
+            connection.execute(
+                f"SELECT id, rowid FROM synsets WHERE id IN ({_placeholders(synset_ids)}) AND lexicon_rowid IN ({lex})",
+                (*synset_ids, *lexicons),
+            ).fetchall()
+        )
+        sources = list(rowids.values())
+        source_list = _placeholders(sources)
+
+        # Synsets related through "similar to" and "also see".
+        related = defaultdict(lambda: {"similar": [], "also": []})
+        for source, rel_type, target in connection.execute(
+            f"""
+            SELECT rel.source_rowid, rt.type, rel.target_rowid
+              FROM synset_relations AS rel
+              JOIN relation_types AS rt ON rt.rowid = rel.type_rowid
+              JOIN synsets AS tgt ON tgt.rowid = rel.target_rowid
+             WHERE rel.source_rowid IN ({source_list})
+               AND rt.type IN ('similar', 'also')
+               AND rel.lexicon_rowid IN ({lex})
+               AND tgt.lexicon_rowid IN ({lex})
+             ORDER BY rel.rowid
+            """,
+            (*sources, *lexicons, *lexicons),
+        ):
+            related[source][rel_type].append(target)
+
+        # Lemmas of the synsets and of their related synsets.
+        members = list({*sources, *(t for rels in related.values() for ts in rels.values() for t in ts)})
+        lemmas = defaultdict(list)
+        for synset, lemma in connection.execute(
+            f"""
+            SELECT s.synset_rowid, {_LEMMA.format(entry="s")}
+              FROM senses AS s
+             WHERE s.synset_rowid IN ({_placeholders(members)})
+               AND s.lexicon_rowid IN ({lex})
+             ORDER BY s.synset_rowid, s.synset_rank, s.rowid
+            """,
+            (*members, *lexicons),
+        ):
+            lemmas[synset].append(lemma)
+
+        antonyms = defaultdict(list)
+        for synset, lemma in connection.execute(
+            f"""
+            SELECT src.synset_rowid, {_LEMMA.format(entry="tgt")}
+              FROM senses AS src
+              JOIN sense_relations AS rel ON rel.source_rowid = src.rowid
+              JOIN relation_types AS rt ON rt.rowid = rel.type_rowid
+              JOIN senses AS tgt ON tgt.rowid = rel.target_rowid
+             WHERE src.synset_rowid IN ({source_list})
+               AND rt.type = 'antonym'
+               AND src.lexicon_rowid IN ({lex})
+               AND rel.lexicon_rowid IN ({lex})
+               AND tgt.lexicon_rowid IN ({lex})
+             ORDER BY src.synset_rowid, src.synset_rank, src.rowid, rel.rowid
+            """,
+            (*sources, *lexicons, *lexicons, *lexicons),
+        ):
+            antonyms[synset].append(lemma)
+
+        definitions: Dict[int, str] = {}
+        for synset, definition in connection.execute(
+            f"""
+            SELECT synset_rowid, definition
+              FROM definitions
+             WHERE synset_rowid IN ({source_list}) AND lexicon_rowid IN ({lex})
+             ORDER BY rowid
+            """,
+            (*sources, *lexicons),
+        ):
+            definitions.setdefault(synset, definition)
+
+        examples = defaultdict(list)
+        for synset, example in connection.execute(
+            f"""
+            SELECT synset_rowid, example
+              FROM synset_examples
+             WHERE synset_rowid IN ({source_list}) AND lexicon_rowid IN ({lex})
+             ORDER BY rowid
+            """,
+            (*sources, *lexicons),
+        ):
+            examples[synset].append(example)
+
+        details = {}
+        for synset_id, rowid in rowids.items():
+            details[synset_id] = {
+                "lemmas": lemmas[rowid],
+                "definition": definitions.get(rowid),
+                "examples": examples[rowid],
+                "antonyms": antonyms[rowid],
+                "similar": [lemma for target in related[rowid]["similar"] for lemma in lemmas[target]],
+                "also": [lemma for target in related[rowid]["also"] for lemma in lemmas[target]],
+            }
+        return details
@@ -2,6 +2,9 @@
 # SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import sqlite3
+import sys
+import time
 from gettext import gettext as _
 
 import gi
@@ -11,9 +14,13 @@ gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 from gi.repository import Adw, Gio, GLib, Gtk  # noqa
 
-from wordbook import base, utils  # noqa
-from wordbook.window import WordbookWindow  # noqa
+from wordbook import base, profiling, tracing, utils  # noqa
+from wordbook.search_provider import SearchProvider  # noqa
 from wordbook.settings import Settings  # noqa
+from wordbook.tasks import SCHEDULER  # noqa
+
+
+SEARCH_PROVIDER_TIMEOUT = 60000  # Milliseconds to keep running after a search when started by GNOME Shell.
 
 
 class Application(Adw.Application):
@@ -24,7 +31,10 @@ class Application(Adw.Application):
     version = "0.0.0"
 
     lookup_term = ""
+    print_stats = False
+    startup_timing = False
     win = None
+    search_provider = None
 
     def __init__(self, app_id, version):
         """Initialize the application."""
@@ -55,6 +65,86 @@ class Application(Adw.Application):
             "Print version info",
             None,
         )
+        self.add_main_option(
+            "import-definitions",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            "Import custom definitions from a folder, a JSON file or a JSON-lines file",
+            "PATH",
+        )
+        self.add_main_option(
+            "export-definitions",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            "Export custom definitions to a JSON-lines file",
+            "PATH",
+        )
+        self.add_main_option(
+            "batch",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            "Print definitions as JSON lines for the terms listed in a file, or stdin if PATH is -",
+            "PATH",
+        )
+        self.add_main_option(
+            "workers",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.INT,
+            "Number of parallel lookups in batch and server modes",
+            "N",
+        )
+        self.add_main_option(
+            "no-pronunciations",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Leave out pronunciations in batch mode",
+            None,
+        )
+        self.add_main_option(
+            "serve",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            "Serve lookups as JSON over HTTP on HOST:PORT, or on a Unix socket if ADDRESS is a path",
+            "ADDRESS",
+        )
+        self.add_main_option(
+            "stats",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Time each lookup stage and print the statistics on exit",
+            None,
+        )
+        self.add_main_option(
+            "profile",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Profile the session with cProfile until exit",
+            None,
+        )
+        self.add_main_option(
+            "profile-memory",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Also trace memory allocations while profiling",
+            None,
+        )
+        self.add_main_option(
+            "startup-timing",
+            0,
+            GLib.OptionFlags.HIDDEN,
+            GLib.OptionArg.NONE,
+            "Print when the first frame is drawn and when lookups are ready, then quit",
+            None,
+        )
         self.add_main_option(
             "verbose",
             ord("v"),
@@ -64,21 +154,107 @@ class Application(Adw.Application):
             None,
         )
 
-        Adw.StyleManager.get_default().set_color_scheme(
-            Adw.ColorScheme.FORCE_DARK if Settings.get().gtk_dark_ui else Adw.ColorScheme.PREFER_LIGHT
-        )
-
         base.create_required_dirs()
 
+    def do_handle_local_options(self, options):
+        """Handle command line options that do not need the window."""
+        # The options are read without ending the dict, since do_command_line gets its options from it too.
+
+        def value(name):
+            variant = options.lookup_value(name, None)
+            return None if variant is None else variant.unpack()
+
+        self.print_stats = options.contains("stats")
+        self.startup_timing = options.contains("startup-timing")
+        tracing.TRACER.enabled = self.development_mode or self.print_stats or options.contains("verbose")
+
+        if options.contains("import-definitions"):
+            try:
+                count = base.CDEF_INDEX.store.import_glossary(value("import-definitions"))
+            except (OSError, ValueError, sqlite3.Error) as ex:
+                print(f"Failed to import custom definitions: {ex}")
+                return 1
+            print(f"Imported {count} custom definitions.")
+            return 0
+
+        if options.contains("export-definitions"):
+            try:
+                count = base.CDEF_INDEX.store.export(value("export-definitions"))
+            except (OSError, sqlite3.Error) as ex:
+                print(f"Failed to export custom definitions: {ex}")
+                return 1
+            print(f"Exported {count} custom definitions.")
+            return 0
+
+        if options.contains("batch"):
+            from wordbook import batch
+
+            utils.log_init(self.development_mode or options.contains("verbose"))
+            status = batch.run(
+                value("batch"),
+                workers=value("workers"),
+                accent=Settings.get().pronunciations_accent,
+                pronounce=not options.contains("no-pronunciations"),
+            )
+            if self.print_stats:
+                print(tracing.TRACER.report(), file=sys.stderr)
+            return status
+
+        if options.contains("serve"):
+            from wordbook import server
+
+            utils.log_init(self.development_mode or options.contains("verbose"))
+            return server.run(value("serve"), value("workers"), Settings.get().pronunciations_accent)
+
+        return -1
+
+    def do_dbus_register(self, connection, object_path):
+        """Export the GNOME Shell search provider."""
+        Adw.Application.do_dbus_register(self, connection, object_path)
+        if self.get_flags() & Gio.ApplicationFlags.IS_SERVICE:
+            # Started by Shell for searches, so stay around for the next few keystrokes.
+            self.set_inactivity_timeout(SEARCH_PROVIDER_TIMEOUT)
+        self.search_provider = SearchProvider(self.look_up, self.get_wordlist_future)
+        self.search_provider.register(connection, f"{object_path}/SearchProvider")
+        return True
+
+    def do_dbus_unregister(self, connection, object_path):
+        """Stop exporting the GNOME Shell search provider."""
+        if self.search_provider is not None:
+            self.search_provider.unregister(connection)
+        Adw.Application.do_dbus_unregister(self, connection, object_path)
+
     def do_startup(self):
         """Manage startup of the application."""
         self.set_resource_base_path(utils.RES_PATH)
         Adw.Application.do_startup(self)
 
+        Adw.StyleManager.get_default().set_color_scheme(
+            Adw.ColorScheme.FORCE_DARK if Settings.get().gtk_dark_ui else Adw.ColorScheme.PREFER_LIGHT
+        )
+
+        # Not listed anywhere, for capturing profiles of real sessions. "cpu" or "memory" starts, and either stops.
+        profile_action = Gio.SimpleAction.new("profile", GLib.VariantType.new("s"))
+        profile_action.connect("activate", self.on_profile)
+        self.add_action(profile_action)
+        self.set_accels_for_action("app.profile::cpu", ["<Primary><Shift>p"])
+        self.set_accels_for_action("app.profile::memory", ["<Primary><Shift>m"])
+
+    def do_shutdown(self):
+        """Write unsaved settings, and the profile and lookup statistics if asked to."""
+        Settings.get().flush()
+        self.stop_profiling()
+        if self.print_stats:
+            print(tracing.TRACER.report(), file=sys.stderr)
+            print(SCHEDULER.report(), file=sys.stderr)
+        Adw.Application.do_shutdown(self)
+
     def do_activate(self):
         """Activate the application."""
         self.win = self.get_active_window()
         if not self.win:
+            from wordbook.window import WordbookWindow
+
             self.win = WordbookWindow(
                 application=self,
                 title=_("Wordbook"),
@@ -102,13 +278,45 @@ class Application(Adw.Application):
 
         utils.log_init(self.development_mode or "verbose" in options or False)
 
+        if "profile" in options or "profile-memory" in options:
+            profiling.PROFILER.start(memory="profile-memory" in options)
+
+        self.look_up(term)
+        return 0
+
+    def get_wordlist_future(self):
+        """Return the future of the wordlist loaded by the window, if it has started loading it."""
+        return self.win.wordlist_future if self.win is not None else None
+
+    def look_up(self, term):
+        """Show the window and search for term."""
         if self.win is not None:
             self.win.trigger_search(term)
         else:
             self.lookup_term = term
 
         self.activate()
-        return 0
+
+    def report_startup(self, stage):
+        """Print the time a startup stage was reached at, for benchmarks/startup.py. Quit once ready."""
+        if not self.startup_timing:
+            return
+        print(f"{stage} {time.time():.6f}", flush=True)
+        if stage == "ready":
+            self.quit()
+
+    def on_profile(self, _action, param):
+        """Start profiling, or stop and write the profile if already profiling."""
+        if profiling.PROFILER.active:
+            self.stop_profiling()
+        else:
+            profiling.PROFILER.start(memory=param.unpack() == "memory")
+
+    @staticmethod
+    def stop_profiling():
+        """Stop profiling, if profiling, and tell where the results were written."""
+        for path in profiling.PROFILER.stop():
+            print(f"Wrote {path}")
 
     def on_about(self, _action, _param):
         """Show the about window."""
@@ -136,3 +344,4 @@ class Application(Adw.Application):
         self.set_accels_for_action("win.random-word", ["<Primary>r"])
         self.set_accels_for_action("win.paste-search", ["<Primary><Shift>v"])
         self.set_accels_for_action("win.preferences", ["<Primary>comma"])
+        self.set_accels_for_action("win.lookup-stats", ["<Primary><Shift>d"])
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+profiling contains the on-demand CPU and memory profiler, used to capture where time and memory go in a real session.
+
+profiling is a part of Wordbook.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import List
+
+from wordbook import utils
+
+# Since Python 3.12, a profiler sees every thread, and only one can be enabled at a time.
+_PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    """
+    Captures a cProfile profile of the main thread and of the worker tasks run through wrap(), until stopped.
+
+    When started with memory=True, it also traces allocations with tracemalloc and snapshots them around the code
+    decorated with measure_allocations(). Profiles and reports are written to utils.PROFILE_DIR.
+    """
+
+    def __init__(self):
+        """Initialize a stopped profiler."""
+        self.active = False
+        self.memory = False
+        self._session = 0
+        self._main_profile = None
+        self._profiles = []
+        self._ranges = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self, memory: bool = False):
+        """Start profiling the calling thread, which should be the main thread, and the wrapped worker tasks."""
+        import cProfile
+
+        if self.active:
+            return
+        with self._lock:
+            self._session += 1
+            self._profiles = []
+            self._ranges = {}
+            self.memory = memory
+            if memory:
+                import tracemalloc
+
+                tracemalloc.start()
+                self._ranges["session"] = [self._snapshot(), None, 0]
+            self.active = True
+        self._main_profile = cProfile.Profile()
+        self._main_profile.enable()
+        utils.log_info("Profiling started.")
+
+    def stop(self) -> List[str]:
+        """Stop profiling and write the results. Return the paths of the files written."""
+        import pstats
+
+        if not self.active:
+            return []
+        self._main_profile.disable()
+        with self._lock:
+            self.active = False
+            if self.memory:
+                self._ranges["session"][1:] = [self._snapshot(), 1]
+            profiles = [self._main_profile, *self._profiles]
+        self._main_profile = None
+
+        os.makedirs(utils.PROFILE_DIR, exist_ok=True)
+        prefix = os.path.join(utils.PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S"))
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(f"{prefix}.pstats")
+        with open(f"{prefix}.txt", "w") as report:
+            stats.stream = report
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(60)
+        paths = [f"{prefix}.pstats", f"{prefix}.txt"]
+
+        if self.memory:
+            self._write_allocations(f"{prefix}-memory.txt")
+            paths.append(f"{prefix}-memory.txt")
+        utils.log_info(f"Profiling stopped, wrote {', '.join(paths)}.")
+        return paths
+
+    def wrap(self, function):
+        """Wrap a function run on a worker thread so that it is profiled while the profiler is active."""
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.active or _PROFILES_ALL_THREADS or getattr(self._local, "profiling", False):
+                return function(*args, **kwargs)
+            import cProfile
+
+            session = self._session
+            profile = cProfile.Profile()
+            self._local.profiling = True
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.profiling = False
+                with self._lock:
+                    if self.active and self._session == session:
+                        self._profiles.append(profile)
+
+        return wrapper
+
+    @contextmanager
+    def allocations(self, label: str):
+        """
+        Snapshot allocations around a block while tracing memory.
+
+        For a block run repeatedly, the report compares the first snapshot before it with the last one after it, so
+        that growth across repeated lookups shows up.
+        """
+        if not (self.active and self.memory):
+            yield
+            return
+        if label not in self._ranges:
+            self._ranges[label] = [self._snapshot(), None, 0]
+        try:
+            yield
+        finally:
+            if self.active and self.memory:
+                snapshot = self._snapshot()
+                with self._lock:
+                    if label in self._ranges:
+                        self._ranges[label][1:] = [snapshot, self._ranges[label][2] + 1]
+
+    @staticmethod
+    def _snapshot():
+        import tracemalloc
+
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def _write_allocations(self, path: str):
+        import tracemalloc
+
+        with self._lock:
+            ranges, self._ranges = self._ranges, {}
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(path, "w") as report:
+            report.write(f"Traced memory: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n")
+            for label, (before, after, runs) in ranges.items():
+                if after is None:
+                    continue
+                report.write(f"\nAllocated by {label} ({runs} runs), largest differences:\n")
+                for stat in after.compare_to(before, "lineno")[:25]:
+                    report.write(f"  {stat}\n")
+
+
+PROFILER = Profiler()
+
+
+def measure_allocations(label: str):
+    """Decorate a function to snapshot allocations around it while tracing memory."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.memory or not PROFILER.active:
+                return function(*args, **kwargs)
+            with PROFILER.allocations(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+pronunciation contains the espeak-ng helpers and the persistent store of generated pronunciations.
+
+pronunciation is a part of Wordbook.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, Sequence
+
+from wordbook import utils
+
+BATCH_SIZE = 500  # Terms transcribed per espeak-ng invocation during pre-generation.
+SENTINEL = "qzxqzx"  # Nonsense word separating terms in batched espeak-ng input.
+
+
+def clean_ipa(ipa_output: str) -> str:
+    """Format raw espeak-ng IPA output for display."""
+    return " /{0}/".format(ipa_output.strip().replace("\n ", " "))
+
+
+@lru_cache(maxsize=1)
+def get_espeak_version() -> str | None:
+    """Get the installed espeak-ng version, or None if espeak-ng is missing."""
+    import subprocess
+
+    try:
+        version_output = subprocess.run(["espeak-ng", "--version"], capture_output=True, check=False).stdout.decode()
+    except OSError:
+        return None
+    match = re.search(r"text-to-speech:\s*(\S+)", version_output)
+    if match:
+        return match.group(1)
+    return version_output.strip() or None
+
+
+def transcribe(term: str, accent="us") -> str:
+    """Get the pronunciation of a single term from espeak-ng."""
+    import subprocess
+
+    pron_output = (
+        subprocess.Popen(
+            ["espeak-ng", "-v", f"en-{accent}", "--ipa", "-q", term],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        .communicate()[0]
+        .decode()
+    )
+    return clean_ipa(pron_output)
+
+
+def transcribe_batch(terms: Sequence[str], accent="us") -> List[str]:
+    """
+    Get the pronunciations of many terms from a single espeak-ng invocation.
+
+    Every input line is made its own clause and terms are separated by a sentinel word, so that the output can be
+    split back into one pronunciation per term. Falls back to one invocation per term if that fails.
+    """
+    import subprocess
+
+    sentinel_ipa = transcribe(SENTINEL, accent)
+    batch_input = "".join(f"{term}\n{SENTINEL}\n" for term in terms)
+    batch_output = subprocess.run(
+        ["espeak-ng", "-v", f"en-{accent}", "--ipa", "-q", "-l", "1000", "--stdin"],
+        input=batch_input.encode(),
+        capture_output=True,
+        check=False,
+    ).stdout.decode()
+
+    results = []
+    lines: List[str] = []
+    for line in batch_output.splitlines():
+        if clean_ipa(line) == sentinel_ipa:
+            results.append(clean_ipa("\n".join(lines)))
+            lines = []
+        else:
+            lines.append(line)
+
+    if len(results) != len(terms):
+        utils.log_warning("Batched espeak-ng output is misaligned, transcribing one term at a time.")
+        return [transcribe(term, accent) for term in terms]
+    return results
+
+
+class PronunciationStore:
+    """Persistent store of pronunciations keyed by term, accent and espeak-ng version."""
+
+    def __init__(self, path: str):
+        """Initialize the store. The database is opened on first use."""
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS pronunciations ("
+                "term TEXT NOT NULL, accent TEXT NOT NULL, version TEXT NOT NULL, ipa TEXT NOT NULL, "
+                "PRIMARY KEY (term, accent, version)) WITHOUT ROWID"
+            )
+        return self._connection
+
+    def get(self, term: str, accent: str, version: str) -> str | None:
+        """Get a stored pronunciation."""
+        try:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT ipa FROM pronunciations WHERE term = ? AND accent = ? AND version = ?",
+                        (term, accent, version),
+                    )
+                    .fetchone()
+                )
+        except sqlite3.Error:
+            utils.log_warning("Failed to read the pronunciation store.")
+            return None
+        return row[0] if row else None
+
+    def put_many(self, rows: Iterable[tuple]):
+        """Store (term, accent, version, ipa) rows in one transaction."""
+        try:
+            with self._lock, self._connect() as connection:
+                connection.executemany("INSERT OR REPLACE INTO pronunciations VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            utils.log_warning("Failed to write to the pronunciation store.")
+
+    def terms(self, accent: str, version: str) -> set:
+        """Get every term with a stored pronunciation for the accent and version."""
+        try:
+            with self._lock:
+                return {
+                    row[0]
+                    for row in self._connect().execute(
+                        "SELECT term FROM pronunciations WHERE accent = ? AND version = ?", (accent, version)
+                    )
+                }
+        except sqlite3.Error:
+            utils.log_warning("Failed to read the pronunciation store.")
+            return set()
+
+    def pregenerate(self, terms: Iterable[str], accent="us", workers: int | None = None) -> int:
+        """
+        Generate and store the pronunciations of every term that is not stored yet.
+
+        Batches of terms are fed to concurrently running espeak-ng processes. Returns the number of new entries.
+        """
+        version = get_espeak_version()
+        if version is None:
+            utils.log_warning("espeak-ng is not available, not generating pronunciations.")
+            return 0
+
+        known = self.terms(accent, version)
+        pending = sorted({term for term in terms if term not in known})
+        batches = [pending[i : i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        utils.log_info(f"Generating {len(pending)} pronunciations in {len(batches)} batches.")
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for batch, prons in zip(batches, pool.map(lambda batch: transcribe_batch(batch, accent), batches)):
+                self.put_many((term, accent, version, pron) for term, pron in zip(batch, prons) if pron.strip("/ "))
+
+        utils.log_info("Finished generating pronunciations.")
+        return len(pending)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+search contains the scheduler that debounces searches and drops the ones that have been superseded.
+
+search is a part of Wordbook.
+"""
+
+import threading
+from typing import Callable
+
+from wordbook import utils
+from wordbook.tasks import SCHEDULER, Priority, TaskScheduler
+
+
+class SearchScheduler:
+    """
+    Runs searches one at a time as interactive tasks of the task scheduler, keeping only the latest request.
+
+    Each request gets a generation number, and starts once no newer request has come in for its debounce delay. The
+    search function is called with the text and its generation, and should check is_current(generation) before each
+    expensive stage and before showing anything, so that lookups the user has typed past are dropped.
+    """
+
+    def __init__(
+        self, search: Callable[[str, int, bool], None], delay: float = 0.0, scheduler: TaskScheduler | None = None
+    ):
+        """Initialize the scheduler for search(text, generation, pass_check), debouncing by delay seconds."""
+        self.search = search
+        self.delay = delay
+        self.generation = 0
+        self.submitted = 0
+        self.started = 0
+        self._scheduler = scheduler or SCHEDULER
+        self._lock = threading.Lock()
+
+    def submit(self, text: str, pass_check: bool = False, delay: float | None = None) -> int:
+        """
+        Request a search for text, superseding any search not yet finished. Return the generation of the request.
+
+        delay overrides the debounce delay, for example to search at once when the search button is clicked.
+        """
+        with self._lock:
+            self.generation += 1
+            self.submitted += 1
+            self._scheduler.submit(
+                Priority.INTERACTIVE,
+                self._run,
+                text,
+                self.generation,
+                pass_check,
+                key=self,  # Replaces the search still waiting, and runs after the one still running.
+                delay=self.delay if delay is None else delay,
+            )
+            return self.generation
+
+    def cancel(self):
+        """Drop the pending search and make the running one stale."""
+        with self._lock:
+            self.generation += 1
+            self._scheduler.cancel(self)
+
+    def is_current(self, generation: int) -> bool:
+        """Return whether the search of the given generation is still the latest one requested."""
+        return generation == self.generation
+
+    def _run(self, text, generation, pass_check):
+        if not self.is_current(generation):
+            return
+        self.started += 1
+        utils.log_debug(f"Searching {text!r}, {self.started} of {self.submitted} requested searches run.")
+        self.search(text, generation, pass_check)
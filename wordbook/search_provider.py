@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+search_provider contains the GNOME Shell search provider, served over D-Bus by the application.
+
+search_provider is a part of Wordbook.
+"""
+
+from concurrent.futures import Future
+from typing import Callable, List
+
+from gi.repository import Gio, GLib
+
+from wordbook import base, utils
+from wordbook.cache import LRUCache
+from wordbook.wordlist import normalize
+
+SEARCH_PROVIDER_XML = """
+<node>
+  <interface name="org.gnome.Shell.SearchProvider2">
+    <method name="GetInitialResultSet">
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="as" name="results" direction="out"/>
+    </method>
+    <method name="GetSubsearchResultSet">
+      <arg type="as" name="previous_results" direction="in"/>
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="as" name="results" direction="out"/>
+    </method>
+    <method name="GetResultMetas">
+      <arg type="as" name="identifiers" direction="in"/>
+      <arg type="aa{sv}" name="metas" direction="out"/>
+    </method>
+    <method name="ActivateResult">
+      <arg type="s" name="identifier" direction="in"/>
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="u" name="timestamp" direction="in"/>
+    </method>
+    <method name="LaunchSearch">
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="u" name="timestamp" direction="in"/>
+    </method>
+  </interface>
+</node>
+"""
+
+
+class SearchProvider:
+    """
+    Answers GNOME Shell searches from the wordlist prefix index, and describes results by their first definition.
+
+    Result identifiers are the display words themselves. The wordlist of the window is used if it has one, and
+    otherwise loaded on the first search. Nothing is returned until the wordlist is loaded, as Shell would rather
+    drop a slow provider than wait for it.
+    """
+
+    MAX_RESULTS = 20
+
+    def __init__(self, open_term: Callable[[str], None], shared_wordlist: Callable[[], Future | None] = lambda: None):
+        """
+        Initialize the provider. open_term is called with the term to show when a result is activated.
+
+        shared_wordlist returns the future of a wordlist already being loaded by the application, if any.
+        """
+        self.open_term = open_term
+        self.shared_wordlist = shared_wordlist
+        self._glosses = LRUCache(maxsize=4096)
+        self._wordlist_future: Future | None = None
+        self._registration_id = 0
+
+    def register(self, connection: Gio.DBusConnection, object_path: str):
+        """Export the provider on connection."""
+        interface = Gio.DBusNodeInfo.new_for_xml(SEARCH_PROVIDER_XML).interfaces[0]
+        self._registration_id = connection.register_object(object_path, interface, self._on_method_call, None, None)
+
+    def unregister(self, connection: Gio.DBusConnection):
+        """Stop exporting the provider."""
+        if self._registration_id:
+            connection.unregister_object(self._registration_id)
+            self._registration_id = 0
+
+    def get_initial_result_set(self, terms: List[str]) -> List[str]:
+        """Return the words starting with the search terms."""
+        index = self._get_index()
+        if index is None:
+            return []
+        return index.complete(" ".join(terms), self.MAX_RESULTS)
+
+    def get_subsearch_result_set(self, previous_results: List[str], terms: List[str]) -> List[str]:
+        """
+        Narrow down the results of a previous search to the words starting with the longer search terms.
+
+        Falls back to a fresh search if the previous results were cut off at MAX_RESULTS, since the words that did not
+        fit may still match, or if there were none, since the wordlist may not have been loaded yet.
+        """
+        if not previous_results or len(previous_results) >= self.MAX_RESULTS:
+            return self.get_initial_result_set(terms)
+        prefix = normalize(" ".join(terms))
+        return [word for word in previous_results if normalize(word).startswith(prefix)]
+
+    def get_result_metas(self, identifiers: List[str]) -> List[dict]:
+        """Describe results by their first definition."""
+        missing = [word for word in identifiers if self._glosses.get(word) is None]
+        if missing:
+            found = base.LOOKUP_ENGINE.first_glosses(missing)
+            for word in missing:
+                self._glosses.put(word, found.get(word, ""))
+        return [
+            {
+                "id": GLib.Variant("s", word),
+                "name": GLib.Variant("s", word),
+                "description": GLib.Variant("s", self._glosses.get(word, "")),
+            }
+            for word in identifiers
+        ]
+
+    def _get_index(self):
+        if self._wordlist_future is None:
+            self._wordlist_future = self.shared_wordlist()
+            if self._wordlist_future is None and base.WordnetDownloader.check_status():
+                self._wordlist_future = base.get_wn_file(base.get_wn_instance(lambda: None))
+        if self._wordlist_future is None or not self._wordlist_future.done():
+            return None
+        wn_file = self._wordlist_future.result()
+        return wn_file["index"] if wn_file is not None else None
+
+    def _on_method_call(self, _connection, _sender, _object_path, _interface_name, method_name, parameters, invocation):
+        """Dispatch a D-Bus method call."""
+        application = Gio.Application.get_default()
+        application.hold()
+        try:
+            args = parameters.unpack()
+            if method_name == "GetInitialResultSet":
+                invocation.return_value(GLib.Variant("(as)", (self.get_initial_result_set(*args),)))
+            elif method_name == "GetSubsearchResultSet":
+                invocation.return_value(GLib.Variant("(as)", (self.get_subsearch_result_set(*args),)))
+            elif method_name == "GetResultMetas":
+                invocation.return_value(GLib.Variant("(aa{sv})", (self.get_result_metas(*args),)))
+            elif method_name == "ActivateResult":
+                self.open_term(args[0])
+                invocation.return_value(None)
+            elif method_name == "LaunchSearch":
+                self.open_term(" ".join(args[0]))
+                invocation.return_value(None)
+        except Exception as ex:  # Report any failure to Shell instead of leaving the call hanging.
+            utils.log_error(f"Search provider call {method_name} failed: {ex}")
+            invocation.return_dbus_error("org.freedesktop.DBus.Error.Failed", str(ex))
+        finally:
+            application.release()
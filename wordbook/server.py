@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+server contains the local lookup service, a JSON API over HTTP that keeps WordNet and the indexes loaded.
+
+server is a part of Wordbook.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlsplit
+
+from wordbook import base, tracing, utils
+
+MAX_COMPLETIONS = 50  # Most completions answered per request.
+
+
+class RequestStats:
+    """Counts requests and keeps their recent latencies, per endpoint."""
+
+    def __init__(self, window: int = 1024):
+        """Initialize the stats, keeping the latencies of the last window requests of each endpoint."""
+        self.started = time.monotonic()
+        self.window = window
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float, error: bool = False):
+        """Record a request that took latency seconds, and whether it failed."""
+        with self._lock:
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            self._errors[endpoint] = self._errors.get(endpoint, 0) + error
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(latency)
+
+    def snapshot(self) -> dict:
+        """Return counts, throughput and latency percentiles in milliseconds."""
+        uptime = time.monotonic() - self.started
+        with self._lock:
+            endpoints = {}
+            for endpoint, count in self._counts.items():
+                latencies = sorted(self._latencies[endpoint])
+                endpoints[endpoint] = {
+                    "count": count,
+                    "errors": self._errors[endpoint],
+                    "per_second": count / uptime if uptime else 0.0,
+                    **{
+                        f"p{percent}_ms": tracing.percentile(latencies, percent) * 1000 for percent in (50, 95, 99)
+                    },
+                }
+        return {"uptime_s": uptime, "endpoints": endpoints}
+
+
+class LookupService:
+    """Answers lookups from a resident WordNet instance and the completion and spelling indexes."""
+
+    def __init__(self, accent="us"):
+        """Load WordNet and the indexes. Raises wn.Error if WordNet is not available."""
+        wn = base.import_wn()
+        if not base.WordnetDownloader.check_status():
+            raise wn.Error("The WordNet database has not been downloaded.")
+        self.accent = accent
+        self.stats = RequestStats()
+        self.wn_instance = wn.Wordnet(lexicon=base.WN_DB_VERSION)
+        wn_future: Future = Future()
+        wn_future.set_result(self.wn_instance)
+        wordlist_future = base.get_wn_file(wn_future)
+        self.wordlist = wordlist_future.result()
+        self.spelling = base.get_spelling_index(wordlist_future).result()
+
+    def complete(self, query: Dict[str, str]) -> dict:
+        """Complete the prefix given as q, with up to limit completions, at most MAX_COMPLETIONS."""
+        text = query.get("q", "")
+        try:
+            limit = int(query.get("limit", 10))
+        except ValueError:
+            raise ValueError("limit must be an integer.") from None
+        if limit < 1:
+            raise ValueError("limit must be positive.")
+        limit = min(limit, MAX_COMPLETIONS)
+        if not text:
+            return {"query": text, "completions": []}
+        completions = self.wordlist["index"].complete(text, limit)
+        for item in base.CDEF_INDEX.complete(text, limit):
+            if len(completions) >= limit:
+                break
+            if item not in completions:
+                completions.append(item)
+        return {"query": text, "completions": completions}
+
+    def define(self, query: Dict[str, str]) -> dict:
+        """Look up the term given as q, suggesting similar words if nothing is found."""
+        text = base.clean_search_terms(query.get("q", ""))
+        pronounce = query.get("pronounce", "yes") != "no"
+        wordcol, sencol = base.get_colors(query.get("theme") == "dark")
+        data = base.fetch_definition(text, wordcol, sencol, self.wn_instance, accent=self.accent, pronounce=pronounce)
+        found = data["result"] is not None or data["out_string"] is not None
+        suggestions = [] if found or self.spelling is None else self.spelling.suggest(text)
+        return {"query": text, "found": found, **data, "suggestions": suggestions}
+
+    def pronounce(self, query: Dict[str, str]) -> dict:
+        """Get the pronunciation of the term given as q."""
+        text = query.get("q", "")
+        return {"query": text, "pronunciation": base.get_final_pronunciation(text, query.get("accent", self.accent))}
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the lookup service and answers with JSON."""
+
+    server: "LookupServer"
+
+    def do_GET(self):
+        """Handle a GET request."""
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint = url.path.strip("/")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        service = self.server.service
+
+        if endpoint == "stats":
+            self._send_json(
+                HTTPStatus.OK,
+                {
+                    **service.stats.snapshot(),
+                    "cache": base.DEFINITION_CACHE.stats(),
+                    "stages": tracing.TRACER.snapshot(),
+                },
+            )
+            return
+        if endpoint not in ("define", "complete", "pronounce"):
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint: {url.path}"})
+            return
+        try:
+            response = getattr(service, endpoint)(query)
+        except ValueError as ex:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(ex)})
+            service.stats.record(endpoint, time.perf_counter() - started, error=True)
+            return
+        except Exception as ex:  # espeak-ng is missing or the database failed, for example.
+            utils.log_error(f"Request {self.path} failed: {ex}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(ex) or type(ex).__name__})
+            service.stats.record(endpoint, time.perf_counter() - started, error=True)
+            return
+        self._send_json(HTTPStatus.OK, response)
+        service.stats.record(endpoint, time.perf_counter() - started)
+
+    def log_message(self, format, *args):
+        """Log requests only when verbose."""
+        utils.log_debug(format % args)
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class LookupServer(HTTPServer):
+    """
+    HTTP server handling requests on a fixed pool of workers.
+
+    Requests beyond what the pool can queue are refused with 503 instead of piling up.
+    """
+
+    def __init__(self, address, service: LookupService, workers: int | None = None):
+        """Initialize the server listening on a (host, port) address."""
+        super().__init__(address, LookupRequestHandler)
+        self.service = service
+        workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Server")
+        self._slots = threading.BoundedSemaphore(workers * 4)
+
+    def process_request(self, request, client_address):
+        """Hand the request to the pool, or refuse it if the pool is saturated."""
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # Keep serving, as socketserver does.
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        """Stop the workers and close the socket."""
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+class UnixLookupServer(LookupServer):
+    """LookupServer listening on a Unix socket."""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        """Bind to the socket path, replacing a stale socket."""
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = self.server_address
+        self.server_port = 0
+
+    def get_request(self):
+        """Accept a connection. Unix sockets have no client address, so use the socket path instead."""
+        request, _address = self.socket.accept()
+        return request, (self.server_address, 0)
+
+
+def run(address: str, workers: int | None = None, accent="us") -> int:
+    """Serve lookups on address until interrupted. address is host:port, or a path for a Unix socket."""
+    wn = base.import_wn()
+    try:
+        service = LookupService(accent)
+    except (wn.Error, wn.DatabaseError):
+        print("WordNet is not available. Start Wordbook once to download it.")
+        return 1
+
+    try:
+        if "/" in address:
+            server = UnixLookupServer(address, service, workers)
+        else:
+            host, _, port = address.rpartition(":")
+            server = LookupServer((host or "127.0.0.1", int(port)), service, workers)
+    except (OSError, ValueError) as ex:
+        print(f"Failed to listen on {address}: {ex}")
+        return 1
+
+    print(f"Serving lookups on {address}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -3,11 +3,16 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import configparser
+import io
 import json
 import os
+import tempfile
+import threading
 
 from wordbook import utils
 
+SAVE_DELAY = 0.5  # Seconds to wait for more changes before writing the settings.
+
 
 class WordbookConfigParser(configparser.ConfigParser):
     def __init__(self, **kwargs):
@@ -50,6 +55,9 @@ class Settings:
 
     config = WordbookConfigParser()
     instance = None
+    _save_lock = threading.Lock()  # Guards the config and the scheduled save.
+    _write_lock = threading.Lock()  # Keeps concurrent saves in order.
+    _save_timer = None
 
     def __init__(self):
         """Initialize configuration."""
@@ -59,6 +67,7 @@ class Settings:
                 "LiveSearch": "yes",
                 "DoubleClick": "no",
                 "PronunciationsAccent": "us",
+                "PregeneratePronunciations": "no",
             }
             self.config["Appearance"] = {
                 "ForceDarkMode": "no",
@@ -115,8 +124,7 @@ class Settings:
     @history.setter
     def history(self, value):
         """Set search history."""
-        self.config.set("Misc", "History", json.dumps(value))
-        self.save_settings()  # Manually save because set_boolean_key is not called.
+        self.set_key("Misc", "History", json.dumps(value))
 
     @property
     def live_search(self):
@@ -128,6 +136,16 @@ class Settings:
         """Set whether to enable Live Search."""
         self.set_boolean_key("Behavior", "LiveSearch", value)
 
+    @property
+    def live_search_delay(self):
+        """Get how many milliseconds Live Search waits for typing to pause before searching."""
+        return self.config.getint("Behavior", "LiveSearchDelay", fallback=150)
+
+    @live_search_delay.setter
+    def live_search_delay(self, value):
+        """Set how many milliseconds Live Search waits for typing to pause before searching."""
+        self.set_key("Behavior", "LiveSearchDelay", str(value))
+
     def load_settings(self):
         """Load settings from file."""
 
@@ -189,6 +207,16 @@ class Settings:
 
             self.save_settings()  # Save before proceeding.
 
+    @property
+    def pregenerate_pronunciations(self):
+        """Get whether to generate pronunciations for the whole wordlist in the background."""
+        return self.config.getboolean("Behavior", "PregeneratePronunciations", fallback=False)
+
+    @pregenerate_pronunciations.setter
+    def pregenerate_pronunciations(self, value):
+        """Set whether to generate pronunciations for the whole wordlist in the background."""
+        self.set_boolean_key("Behavior", "PregeneratePronunciations", value)
+
     @property
     def pronunciations_accent(self):
         """Get pronunciations accent."""
@@ -197,8 +225,7 @@ class Settings:
     @pronunciations_accent.setter
     def pronunciations_accent(self, value):
         """Set pronunciations accent."""
-        self.config.set("Behavior", "PronunciationsAccent", value)
-        self.save_settings()  # Manually save because set_boolean_key is not called.
+        self.set_key("Behavior", "PronunciationsAccent", value)
 
     @property
     def pronunciations_accent_value(self):
@@ -220,11 +247,59 @@ class Settings:
             self.pronunciations_accent = "gb"
 
     def save_settings(self):
-        """Save settings."""
-        with open(utils.CONFIG_FILE, "w") as file:
-            self.config.write(file)
+        """
+        Save settings now, on the calling thread.
+
+        The file is replaced in one step, so that it is never left half written.
+        """
+        with self._write_lock:
+            with self._save_lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                contents = io.StringIO()
+                self.config.write(contents)
+            temp_path = None
+            try:
+                descriptor, temp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(utils.CONFIG_FILE), prefix=".wordbook.conf-"
+                )
+                with os.fdopen(descriptor, "w") as file:
+                    file.write(contents.getvalue())
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, utils.CONFIG_FILE)
+            except OSError:
+                utils.log_error(f"Failed to save the settings to {utils.CONFIG_FILE}.")
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def schedule_save(self):
+        """Save settings on a background thread shortly, together with any other changes made until then."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self._save_scheduled)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save_scheduled(self):
+        with self._save_lock:
+            if self._save_timer is not threading.current_thread():
+                return  # Saved or flushed meanwhile.
+        self.save_settings()
+
+    def flush(self):
+        """Save settings now if a save is scheduled, for example before quitting."""
+        if self._save_timer is not None:
+            self.save_settings()
 
     def set_boolean_key(self, section, key, value):
         """Set a boolean value in the configuration file."""
-        self.config[section][key] = utils.boot_to_str(value)
-        self.save_settings()
+        self.set_key(section, key, utils.boot_to_str(value))
+
+    def set_key(self, section, key, value):
+        """Set a value in the configuration file, saving it shortly."""
+        with self._save_lock:
+            self.config.set(section, key, value)
+        self.schedule_save()
@@ -23,6 +23,7 @@ class SettingsWindow(Adw.PreferencesWindow):
     _double_click_switch = Gtk.Template.Child("double_click_switch")
     _live_search_switch = Gtk.Template.Child("live_search_switch")
     _pronunciations_accent_row = Gtk.Template.Child("pronunciations_accent_row")
+    _pregenerate_pronunciations_switch = Gtk.Template.Child("pregenerate_pronunciations_switch")
 
     def __init__(self, parent: Adw.ApplicationWindow, **kwargs):
         """Initialize the Settings window."""
@@ -36,12 +37,14 @@ class SettingsWindow(Adw.PreferencesWindow):
         self._live_search_switch.connect("notify::active", self._on_live_search_activate)
         self._dark_ui_switch.connect("notify::active", self._on_dark_ui_switch_activate)
         self._pronunciations_accent_row.connect("notify::selected", self._on_pronunciations_accent_activate)
+        self._pregenerate_pronunciations_switch.connect("notify::active", self._on_pregenerate_pronunciations_activate)
 
     def load_settings(self):
         """Load settings from the Settings instance."""
         self._double_click_switch.set_active(Settings.get().double_click)
         self._live_search_switch.set_active(Settings.get().live_search)
         self._pronunciations_accent_row.set_selected(Settings.get().pronunciations_accent_value)
+        self._pregenerate_pronunciations_switch.set_active(Settings.get().pregenerate_pronunciations)
 
         self._dark_ui_switch.set_active(Settings.get().gtk_dark_ui)
 
@@ -58,6 +61,12 @@ class SettingsWindow(Adw.PreferencesWindow):
             self.parent.set_default_widget(self.parent.search_button)
         Settings.get().live_search = switch.get_active()
 
+    def _on_pregenerate_pronunciations_activate(self, switch, _gparam):
+        """Change whether pronunciations are generated in the background."""
+        Settings.get().pregenerate_pronunciations = switch.get_active()
+        if switch.get_active():
+            self.parent.pregenerate_pronunciations()
+
     @staticmethod
     def _on_pronunciations_accent_activate(row, _gparam):
         """Change pronunciations' accent."""
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+speech contains the resident espeak-ng engine used for pronunciations, and reading terms aloud.
+
+speech is a part of Wordbook.
+"""
+
+import ctypes
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict
+
+from wordbook import pronunciation, utils
+
+# Constants from speak_lib.h.
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+ESPEAK_INITIALIZE_DONT_EXIT = 0x8000
+ESPEAK_CHARS_UTF8 = 1
+ESPEAK_PHONEMES_IPA = 0x02
+
+
+def _load_library():
+    """Load and initialize libespeak-ng, or return None if it is unavailable."""
+    import ctypes.util  # Imports subprocess.
+
+    for name in (ctypes.util.find_library("espeak-ng"), "libespeak-ng.so.1"):
+        if not name:
+            continue
+        try:
+            library = ctypes.CDLL(name)
+        except OSError:
+            continue
+
+        library.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        library.espeak_Initialize.restype = ctypes.c_int
+        library.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        library.espeak_SetVoiceByName.restype = ctypes.c_int
+        library.espeak_TextToPhonemes.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_int, ctypes.c_int]
+        library.espeak_TextToPhonemes.restype = ctypes.c_char_p
+
+        # Only used for transcription, so no audio device is opened.
+        if library.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, None, ESPEAK_INITIALIZE_DONT_EXIT) < 0:
+            utils.log_warning("Failed to initialize libespeak-ng.")
+            return None
+        return library
+    return None
+
+
+class SpeechEngine:
+    """
+    Serves IPA transcription requests from one long-lived worker that keeps espeak-ng loaded, and playback requests
+    from another that keeps an espeak-ng process open, reading one line of text to say at a time.
+
+    Transcription falls back to running the espeak-ng command for each request when libespeak-ng cannot be loaded.
+    Playback does not use the library, which is a single instance per process and would hold up transcription until
+    the audio has played.
+    """
+
+    def __init__(self):
+        """Initialize the engine. The library and worker are started on first use."""
+        self.latencies: Dict[str, deque] = {"ipa": deque(maxlen=256), "speak": deque(maxlen=256)}
+        self._library = None
+        self._voice = None
+        self._queue: queue.Queue = queue.Queue()
+        self._playback_queue: queue.Queue = queue.Queue()
+        self._player = None
+        self._started = False
+        self._playback_started = False
+        self._lock = threading.Lock()
+
+    @property
+    def resident(self) -> bool:
+        """Whether requests are served by the resident library instead of the espeak-ng command."""
+        self._start()
+        return self._library is not None
+
+    def speak(self, text: str, speed=120, accent="us") -> Future:
+        """
+        Queue text to be read aloud and return at once. The future is done once espeak-ng has been handed the text, and
+        holds the OSError if espeak-ng is missing.
+        """
+        with self._lock:
+            if not self._playback_started:
+                self._playback_started = True
+                threading.Thread(
+                    target=self._serve, args=(self._playback_queue,), name="SpeechPlayback", daemon=True
+                ).start()
+        future: Future = Future()
+        self._playback_queue.put(("speak", self._say, (text, str(speed), accent), future, time.perf_counter()))
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return request counts and median latencies in milliseconds."""
+        import statistics
+
+        return {
+            kind: {
+                "count": len(latencies),
+                "median_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            }
+            for kind, latencies in self.latencies.items()
+        }
+
+    def transcribe(self, term: str, accent="us") -> str:
+        """Get the IPA pronunciation of term, formatted for display."""
+        if not self.resident:
+            return self._run("ipa", pronunciation.transcribe, term, accent).result()
+        return self._submit("ipa", self._transcribe_library, term, accent).result()
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._library = _load_library()
+            if self._library is None:
+                utils.log_info("libespeak-ng is not available, using the espeak-ng command.")
+                return
+            threading.Thread(target=self._serve, args=(self._queue,), name="SpeechEngine", daemon=True).start()
+
+    def _record(self, kind: str, started: float):
+        latency = time.perf_counter() - started
+        self.latencies[kind].append(latency)
+        utils.log_debug(f"Speech request '{kind}' took {latency * 1000:.1f} ms.")
+
+    def _run(self, kind: str, function, *args) -> Future:
+        """Run a request directly on the calling thread."""
+        future: Future = Future()
+        started = time.perf_counter()
+        try:
+            future.set_result(function(*args))
+        except OSError as ex:
+            future.set_exception(ex)
+        self._record(kind, started)
+        return future
+
+    def _serve(self, requests: queue.Queue):
+        """Handle queued requests for as long as the application runs."""
+        while True:
+            kind, function, args, future, started = requests.get()
+            try:
+                future.set_result(function(*args))
+            except Exception as ex:  # Hand any failure back to the requester.
+                future.set_exception(ex)
+            self._record(kind, started)
+
+    def _set_voice(self, accent: str):
+        if self._voice != accent:
+            self._library.espeak_SetVoiceByName(f"en-{accent}".encode())
+            self._voice = accent
+
+    def _say(self, text: str, speed: str, accent: str):
+        """Hand text to the espeak-ng process, starting a new one if it exited or speaks with other settings."""
+        import subprocess
+
+        arguments = ["espeak-ng", "-s", speed, "-v", f"en-{accent}"]
+        player = self._player
+        if player is None or player.poll() is not None or player.args != arguments:
+            if player is not None and player.poll() is None:
+                player.stdin.close()
+            # Without text to say, espeak-ng says each line it reads, as soon as it is read.
+            player = self._player = subprocess.Popen(
+                arguments,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        try:
+            player.stdin.write(" ".join(text.split()) + "\n")
+            player.stdin.flush()
+        except BrokenPipeError:
+            self._player = None
+            raise
+
+    def _submit(self, kind: str, function, *args) -> Future:
+        """Queue a request for the worker."""
+        future: Future = Future()
+        self._queue.put((kind, function, args, future, time.perf_counter()))
+        return future
+
+    def _transcribe_library(self, term: str, accent: str) -> str:
+        self._set_voice(accent)
+        text = ctypes.create_string_buffer(term.encode())
+        text_pointer = ctypes.c_void_p(ctypes.addressof(text))
+        clauses = []
+        while text_pointer.value:
+            clause = self._library.espeak_TextToPhonemes(
+                ctypes.byref(text_pointer), ESPEAK_CHARS_UTF8, ESPEAK_PHONEMES_IPA
+            )
+            if clause:
+                clauses.append(clause.decode().strip())
+        return pronunciation.clean_ipa(" ".join(clauses))
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+tasks contains the scheduler running all background work on a bounded set of worker threads, most urgent first.
+
+tasks is a part of Wordbook.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Callable, Dict, Hashable
+
+from wordbook import profiling, tracing, utils
+
+
+class Priority(IntEnum):
+    """Priority classes of tasks, most urgent first."""
+
+    INTERACTIVE = 0  # The lookup the user is waiting for.
+    COMPLETION = 1  # Completions of what the user is typing.
+    PREFETCH = 2  # Data needed soon, like the spelling index.
+    BACKGROUND = 3  # Warm-up jobs, like generating pronunciations.
+
+
+class Task(Future):
+    """A function scheduled to run on the task scheduler, and the future of its result."""
+
+    def __init__(self, priority: Priority, function: Callable, args: tuple, kwargs: dict, key, due: float):
+        """Initialize a pending task."""
+        super().__init__()
+        self.priority = priority
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.due = due
+        self.queued = due
+
+
+class TaskScheduler:
+    """
+    Runs tasks on a fixed number of worker threads, always starting the most urgent task that may run.
+
+    One worker is kept for interactive tasks and another for completion and prefetch tasks, and only
+    background_workers run background tasks at once, so that warm-up jobs never hold up a lookup or a completion.
+    Tasks submitted with the same key run one at a time, and a new one replaces the one still waiting. A task must
+    not wait on the result of another, unless that one is interactive; submit it with after= instead.
+    """
+
+    def __init__(self, workers: int | None = None, background_workers: int = 1, window: int = 1024):
+        """Initialize the scheduler. The worker threads are started on the first submission."""
+        self.workers = max(3, workers or min(4, os.cpu_count() or 1))
+        self.background_workers = background_workers
+        self._queues: Dict[Priority, deque] = {priority: deque() for priority in Priority}
+        self._running: Dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._pending_keys: Dict[Hashable, Task] = {}
+        self._running_keys = set()
+        self._stats = {
+            priority: {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0, "waits": deque(maxlen=window)}
+            for priority in Priority
+        }
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def submit(
+        self,
+        priority: Priority,
+        function: Callable,
+        *args,
+        key: Hashable | None = None,
+        delay: float = 0.0,
+        after: Future | None = None,
+        **kwargs,
+    ) -> Task:
+        """
+        Schedule function(*args, **kwargs) and return its task.
+
+        key replaces the task of the same key that has not started yet, and keeps tasks of the key from running at the
+        same time. delay holds the task back for that many seconds, and after until that future is done.
+        """
+        task = Task(priority, function, args, kwargs, key, time.monotonic() + delay)
+        with self._condition:
+            if not self._threads:
+                self._start_workers()
+            self._stats[priority]["submitted"] += 1
+            if key is not None:
+                superseded = self._pending_keys.get(key)
+                if superseded is not None:
+                    superseded.cancel()
+                self._pending_keys[key] = task
+        if after is not None and not after.done():
+            after.add_done_callback(lambda _future: self._enqueue(task))
+        else:
+            self._enqueue(task)
+        return task
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the task of the given key that has not started yet. Return whether there was one."""
+        with self._condition:
+            task = self._pending_keys.pop(key, None)
+            return task is not None and task.cancel()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Return the queue depth, counts and queue wait percentiles in milliseconds of each priority."""
+        with self._condition:
+            priorities = {}
+            for priority, stats in self._stats.items():
+                waits = sorted(stats["waits"])
+                priorities[priority.name.lower()] = {
+                    "queued": sum(not task.cancelled() for task in self._queues[priority]),
+                    "running": self._running[priority],
+                    **{name: stats[name] for name in ("submitted", "completed", "cancelled", "failed")},
+                    **{
+                        f"wait_p{percent}_ms": tracing.percentile(waits, percent) * 1000 if waits else 0.0
+                        for percent in (50, 95)
+                    },
+                    "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+                }
+        return priorities
+
+    def report(self) -> str:
+        """Format the snapshot as a table."""
+        lines = [
+            f"{'priority':<12} {'queued':>6} {'running':>7} {'done':>6} {'cancelled':>9} {'failed':>6} "
+            f"{'wait p50 ms':>11} {'wait p95 ms':>11} {'wait max ms':>11}"
+        ]
+        for priority, stats in self.snapshot().items():
+            lines.append(
+                f"{priority:<12} {stats['queued']:>6} {stats['running']:>7} {stats['completed']:>6} "
+                f"{stats['cancelled']:>9} {stats['failed']:>6} {stats['wait_p50_ms']:>11.2f} "
+                f"{stats['wait_p95_ms']:>11.2f} {stats['wait_max_ms']:>11.2f}"
+            )
+        return "\n".join(lines)
+
+    def _start_workers(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"TaskScheduler-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _enqueue(self, task: Task):
+        with self._condition:
+            task.queued = max(task.due, time.monotonic())
+            self._queues[task.priority].append(task)
+            self._condition.notify_all()
+
+    def _may_start(self, priority: Priority) -> bool:
+        """Check whether a task of the priority may start without taking a worker kept for more urgent tasks."""
+        if sum(self._running.values()) >= self.workers:
+            return False
+        if priority == Priority.INTERACTIVE:
+            return True
+        non_interactive = sum(self._running.values()) - self._running[Priority.INTERACTIVE]
+        if non_interactive >= self.workers - 1:
+            return False
+        if priority != Priority.BACKGROUND:
+            return True
+        return non_interactive < self.workers - 2 and self._running[priority] < self.background_workers
+
+    def _take(self, now: float):
+        """Take the most urgent task that may start. Return it, or None and how long to wait for a delayed one."""
+        wait = None
+        for priority, queue in self._queues.items():
+            if not self._may_start(priority):
+                continue
+            for task in list(queue):
+                if task.cancelled():
+                    queue.remove(task)
+                    self._forget(task)
+                    self._stats[priority]["cancelled"] += 1
+                elif task.due > now:
+                    wait = task.due - now if wait is None else min(wait, task.due - now)
+                elif task.key is None or task.key not in self._running_keys:
+                    queue.remove(task)
+                    self._forget(task)
+                    if task.key is not None:
+                        self._running_keys.add(task.key)
+                    self._running[priority] += 1
+                    return task, None
+        return None, wait
+
+    def _forget(self, task: Task):
+        if task.key is not None and self._pending_keys.get(task.key) is task:
+            del self._pending_keys[task.key]
+
+    def _work(self):
+        while True:
+            with self._condition:
+                task, wait = self._take(time.monotonic())
+                while task is None:
+                    self._condition.wait(wait)
+                    task, wait = self._take(time.monotonic())
+            self._run(task)
+
+    def _run(self, task: Task):
+        stats = self._stats[task.priority]
+        started = time.monotonic()
+        outcome = "cancelled"
+        try:
+            if task.set_running_or_notify_cancel():
+                stats["waits"].append(started - task.queued)
+                if tracing.TRACER.enabled:
+                    tracing.TRACER.record(f"queue.{task.priority.name.lower()}", started - task.queued)
+                try:
+                    task.set_result(profiling.PROFILER.wrap(task.function)(*task.args, **task.kwargs))
+                    outcome = "completed"
+                except Exception as ex:
+                    utils.log_error(f"Task {getattr(task.function, '__name__', task.function)} failed: {ex}")
+                    task.set_exception(ex)
+                    outcome = "failed"
+        finally:
+            with self._condition:
+                stats[outcome] += 1
+                self._running[task.priority] -= 1
+                self._running_keys.discard(task.key)
+                self._condition.notify_all()
+
+
+SCHEDULER = TaskScheduler()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+tracing contains the per-stage timing of lookups, kept as rolling percentiles and logged in verbose mode.
+
+tracing is a part of Wordbook.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, Sequence
+
+from wordbook import utils
+
+_NULL_SPAN = nullcontext()
+
+
+def percentile(values: Sequence[float], percent: int) -> float:
+    """Return the percent percentile of the sorted values, by the nearest rank."""
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "detail", "started")
+
+    def __init__(self, tracer, stage, detail):
+        self.tracer = tracer
+        self.stage = stage
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.tracer.record(self.stage, time.perf_counter() - self.started, self.detail)
+
+
+class Tracer:
+    """
+    Records how long each stage of a lookup takes, keeping the durations of the last window runs of each stage.
+
+    Does nothing until enabled, so that spans cost no more than an attribute check in normal use.
+    """
+
+    def __init__(self, window: int = 1024):
+        """Initialize a disabled tracer."""
+        self.enabled = False
+        self.window = window
+        self._counts: Dict[str, int] = {}
+        self._durations: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, detail: str = ""):
+        """Return a context manager timing the stage. detail is only logged, for example the searched term."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, detail)
+
+    def record(self, stage: str, duration: float, detail: str = ""):
+        """Record that stage took duration seconds."""
+        with self._lock:
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._durations.setdefault(stage, deque(maxlen=self.window)).append(duration)
+        if utils.LOGGER.isEnabledFor(logging.DEBUG):
+            utils.log_debug(f"{stage}{f' [{detail}]' if detail else ''} took {duration * 1000:.2f} ms")
+
+    def wrap_idle(self, stage: str, function: Callable) -> Callable:
+        """
+        Wrap a main loop callback to record the time from now until it has run, including the wait for the main loop.
+
+        Returns function itself when disabled.
+        """
+        if not self.enabled:
+            return function
+        queued = time.perf_counter()
+
+        @wraps(function)
+        def wrapper(*args):
+            try:
+                return function(*args)
+            finally:
+                self.record(stage, time.perf_counter() - queued)
+
+        return wrapper
+
+    def reset(self):
+        """Forget all recorded durations."""
+        with self._lock:
+            self._counts.clear()
+            self._durations.clear()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Return the count of each stage and the percentiles of its recent durations in milliseconds."""
+        with self._lock:
+            stages = {}
+            for stage, count in self._counts.items():
+                durations = sorted(self._durations[stage])
+                stages[stage] = {
+                    "count": count,
+                    **{f"p{percent}_ms": percentile(durations, percent) * 1000 for percent in (50, 95, 99)},
+                    "max_ms": durations[-1] * 1000,
+                }
+        return stages
+
+    def report(self) -> str:
+        """Format the snapshot as a table."""
+        stages = self.snapshot()
+        if not stages:
+            return "No lookup stages recorded."
+        lines = [f"{'stage':<28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for stage, stats in sorted(stages.items()):
+            lines.append(
+                f"{stage:<28} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+TRACER = Tracer()
+
+
+def traced(stage: str):
+    """Decorate a function to record its duration as stage."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with _Span(TRACER, stage, ""):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -7,15 +7,28 @@ import logging
 import os
 import traceback
 
-from gi.repository import GLib
+
+def _xdg_dir(variable, fallback):
+    """Resolve an XDG base directory like GLib does, so that the lookup code does not need to import GLib."""
+    path = os.environ.get(variable)
+    if path and os.path.isabs(path):
+        return path
+    return os.path.join(os.path.expanduser("~"), fallback)
+
 
 RES_PATH = "/dev/mufeed/Wordbook"
 
-CONFIG_DIR = os.path.join(GLib.get_user_config_dir(), "wordbook")
+CONFIG_DIR = os.path.join(_xdg_dir("XDG_CONFIG_HOME", ".config"), "wordbook")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "wordbook.conf")
-DATA_DIR = os.path.join(GLib.get_user_data_dir(), "wordbook")
+DATA_DIR = os.path.join(_xdg_dir("XDG_DATA_HOME", os.path.join(".local", "share")), "wordbook")
 CDEF_DIR = os.path.join(DATA_DIR, "cdef")
+CDEF_FILE = os.path.join(DATA_DIR, "cdef.db")
 WN_DIR = os.path.join(DATA_DIR, "wn")
+WORDLIST_FILE = os.path.join(DATA_DIR, "wordlist.bin")
+PRONUNCIATIONS_FILE = os.path.join(DATA_DIR, "pronunciations.db")
+HISTORY_FILE = os.path.join(DATA_DIR, "history.db")
+SPELLING_FILE = os.path.join(DATA_DIR, "spelling.bin")
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
 
 logging.basicConfig(format="%(asctime)s - [%(levelname)s] [%(threadName)s] (%(module)s:%(lineno)d) %(message)s")
 LOGGER = logging.getLogger()
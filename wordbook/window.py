@@ -6,17 +6,19 @@ import os
 import random
 import sys
 import threading
+import time
 from enum import Enum
 from gettext import gettext as _
-from html import escape
+from gettext import ngettext
 
 from gi.repository import Adw, Gdk, Gio, GLib, GObject, Gtk
-from wn import Error
-from wn.util import ProgressHandler
 
-from wordbook import base, utils
+from wordbook import base, tracing, utils
+from wordbook.search import SearchScheduler
 from wordbook.settings import Settings
-from wordbook.settings_window import SettingsWindow
+from wordbook.tasks import SCHEDULER, Priority
+
+HISTORY_PAGE_SIZE = 50  # Terms of history added to the sidebar at a time.
 
 
 @Gtk.Template(resource_path=f"{utils.RES_PATH}/ui/window.ui")
@@ -35,13 +37,16 @@ class WordbookWindow(Adw.ApplicationWindow):
     _menu_button: Gtk.MenuButton = Gtk.Template.Child("wordbook_menu_button")  # type: ignore
     _main_flap: Adw.Flap = Gtk.Template.Child("main_flap")  # type: ignore
     _history_listbox: Gtk.ListBox = Gtk.Template.Child("history_listbox")  # type: ignore
+    _history_scroll: Gtk.ScrolledWindow = Gtk.Template.Child("history_scroll")  # type: ignore
     _main_stack: Gtk.Stack = Gtk.Template.Child("main_stack")  # type: ignore
     _main_scroll: Gtk.ScrolledWindow = Gtk.Template.Child("main_scroll")  # type: ignore
-    _def_view: Gtk.Label = Gtk.Template.Child("def_view")  # type: ignore
+    _def_list: Gtk.ListView = Gtk.Template.Child("def_list")  # type: ignore
     _def_ctrlr: Gtk.GestureClick = Gtk.Template.Child("def_ctrlr")  # type: ignore
     _pronunciation_view: Gtk.Label = Gtk.Template.Child("pronunciation_view")  # type: ignore
     _term_view: Gtk.Label = Gtk.Template.Child("term_view")  # type: ignore
     _network_fail_status_page: Adw.StatusPage = Gtk.Template.Child("network_fail_status_page")  # type: ignore
+    _search_fail_status_page: Adw.StatusPage = Gtk.Template.Child("search_fail_status_page")  # type: ignore
+    _suggestions_box: Gtk.FlowBox = Gtk.Template.Child("suggestions_box")  # type: ignore
     _retry_button: Gtk.Button = Gtk.Template.Child("retry_button")  # type: ignore
     _exit_button: Gtk.Button = Gtk.Template.Child("exit_button")  # type: ignore
 
@@ -49,15 +54,24 @@ class WordbookWindow(Adw.ApplicationWindow):
 
     _wn_downloader: base.WordnetDownloader = base.WordnetDownloader()
     _wn_future = None
+    _wordlist_future = None
+    _spelling_future = None
 
     _doubled: bool = False
-    _completion_request_count: int = 0
     _searched_term: str | None = None
+    _last_result: dict | None = None
     _search_history = None
-    _search_history_list = []
-    _search_queue = []
+    _search_history_items: dict | None = None  # Terms in the history sidebar to their items.
+    _search_scheduler: SearchScheduler | None = None
+    _view_lock = None
+    _view_changes: dict | None = None
+    _view_generation = 0
+    _view_update_queued = False
     _last_search_fail = False
-    _active_thread = None
+    _pregeneration_task = None
+    _cdef_monitor: Gio.FileMonitor | None = None
+    _def_extra_menu_model: Gio.Menu | None = None
+    _first_frame_handler = 0
     _primary_clipboard_text = None
 
     def __init__(self, term="", **kwargs):
@@ -73,18 +87,28 @@ class WordbookWindow(Adw.ApplicationWindow):
         self.setup_widgets()
         self.setup_actions()
 
+    @property
+    def wordlist_future(self):
+        """The future of the wordlist, or None until WordNet is opened."""
+        return self._wordlist_future
+
     def setup_widgets(self):
-        """Setup the widgets in the window."""
+        """Setup the widgets needed for the first frame. The rest waits for it to be drawn, see _setup_deferred."""
+        self._search_scheduler = SearchScheduler(self._run_search)
+        self._view_lock = threading.Lock()
+        self._view_changes = {}
         self._search_history = Gio.ListStore.new(HistoryObject)
+        self._search_history_items = {}
         self._history_listbox.bind_model(self._search_history, self._create_label)
 
-        self.connect("unrealize", self._on_destroy)
+        self.connect("realize", self._on_realize)
         self._key_ctrlr.connect("key-pressed", self._on_key_pressed)
         self._history_listbox.connect("row-activated", self._on_history_item_activated)
+        self._history_scroll.connect("edge-reached", self._on_history_edge_reached)
 
         self._def_ctrlr.connect("pressed", self._on_def_press_event)
         self._def_ctrlr.connect("stopped", self._on_def_stop_event)
-        self._def_view.connect("activate-link", self._on_link_activated)
+        self._def_list.connect("activate", self._on_definition_activated)
 
         self.search_button.connect("clicked", self.on_search_clicked)
         self._search_entry.connect("changed", self._on_entry_changed)
@@ -106,9 +130,28 @@ class WordbookWindow(Adw.ApplicationWindow):
         # Loading and setup.
         self._dl_wn()
         if self._wn_downloader.check_status():
-            self._wn_future = base.get_wn_file(self._retry_dl_wn)
-            self._set_header_sensitive(True)
             self._page_switch(Page.WELCOME)
+
+        # Set search button visibility.
+        self.search_button.set_visible(not Settings.get().live_search)
+        if not Settings.get().live_search:
+            self.set_default_widget(self.search_button)
+
+        self._def_extra_menu_model = Gio.Menu.new()
+        item = Gio.MenuItem.new("Search Selected Text", "win.search-selected")
+        self._def_extra_menu_model.append_item(item)
+
+        # Each row of the definition list is a label, set up only for the rows on screen.
+        def_factory = Gtk.SignalListItemFactory()
+        def_factory.connect("setup", self._on_definition_setup)
+        def_factory.connect("bind", self._on_definition_bind)
+        self._def_list.set_factory(def_factory)
+
+    def _setup_deferred(self):
+        """Open WordNet and setup completions, history and the custom definitions monitor, after the first frame."""
+        if self._wn_downloader.check_status():
+            self._load_wordnet()
+            self._set_header_sensitive(True)
             if self.lookup_term:
                 self.trigger_search(self.lookup_term)
             self._search_entry.grab_focus_without_selecting()
@@ -121,23 +164,18 @@ class WordbookWindow(Adw.ApplicationWindow):
         self.completer.set_popup_set_width(True)
         self._search_entry.set_completion(self.completer)
 
-        # Load History.
-        self._search_history_list = Settings.get().history
-        for text in self._search_history_list:
-            history_object = HistoryObject(text)
-            self._search_history.insert(0, history_object)
-
-        # Set search button visibility.
-        self.search_button.set_visible(not Settings.get().live_search)
-        if not Settings.get().live_search:
-            self.set_default_widget(self.search_button)
-
-        def_extra_menu_model = Gio.Menu.new()
-        item = Gio.MenuItem.new("Search Selected Text", "win.search-selected")
-        def_extra_menu_model.append_item(item)
+        # Load the first page of history, the rest is loaded as the sidebar is scrolled.
+        if Settings.get().history:
+            # Move the history kept in the settings before the history store.
+            base.HISTORY_STORE.import_terms(Settings.get().history)
+            Settings.get().history = []
+        self._load_history_page()
 
-        # Set the extra menu model for the label
-        self._def_view.set_extra_menu(def_extra_menu_model)
+        # Keep the custom definitions index current.
+        self._cdef_monitor = Gio.File.new_for_path(utils.CDEF_DIR).monitor_directory(
+            Gio.FileMonitorFlags.WATCH_MOVES, None
+        )
+        self._cdef_monitor.connect("changed", self._on_cdef_changed)
 
     def setup_actions(self):
         """Setup the Gio actions for the application window."""
@@ -151,6 +189,7 @@ class WordbookWindow(Adw.ApplicationWindow):
 
         random_word_action: Gio.SimpleAction = Gio.SimpleAction.new("random-word", None)
         random_word_action.connect("activate", self.on_random_word)
+        random_word_action.set_enabled(False)  # Enabled once the wordlist is loaded.
         self.add_action(random_word_action)
 
         search_selected_action: Gio.SimpleAction = Gio.SimpleAction.new("search-selected", None)
@@ -158,6 +197,11 @@ class WordbookWindow(Adw.ApplicationWindow):
         search_selected_action.set_enabled(False)
         self.add_action(search_selected_action)
 
+        # Not listed anywhere, for looking into slow lookups.
+        lookup_stats_action: Gio.SimpleAction = Gio.SimpleAction.new("lookup-stats", None)
+        lookup_stats_action.connect("activate", self.on_lookup_stats)
+        self.add_action(lookup_stats_action)
+
         clipboard: Gdk.Clipboard = self.get_primary_clipboard()
         clipboard.connect("changed", self.on_clipboard_changed)
 
@@ -201,14 +245,42 @@ class WordbookWindow(Adw.ApplicationWindow):
         cancellable = Gio.Cancellable()
         clipboard.read_text_async(cancellable, on_paste)
 
+    def pregenerate_pronunciations(self):
+        """Generate pronunciations for the whole wordlist in the background."""
+        if self._pregeneration_task is not None or self._wordlist_future is None:
+            return
+        if not self._wordlist_future.done() or self._wordlist_future.result() is None:
+            return  # Started once the wordlist is ready.
+        self._pregeneration_task = SCHEDULER.submit(
+            Priority.BACKGROUND,
+            base.PRONUNCIATION_STORE.pregenerate,
+            self._wordlist_future.result()["list"],
+            Settings.get().pronunciations_accent,
+            workers=max(1, (os.cpu_count() or 2) // 2),  # Leave the other cores to lookups.
+        )
+
+    def on_lookup_stats(self, _action, _param):
+        """Show the timing of each lookup stage, turning tracing on if it is off."""
+        if tracing.TRACER.enabled:
+            report = f"{tracing.TRACER.report()}\n\n{SCHEDULER.report()}"
+        else:
+            tracing.TRACER.enabled = True
+            report = _("Tracing is now on. Search for a few terms and open this again.")
+        dialog = Adw.MessageDialog(heading=_("Lookup Statistics"), transient_for=self)
+        dialog.set_extra_child(Gtk.Label(label=report, selectable=True, css_classes=["monospace"]))
+        dialog.add_response("close", _("Close"))
+        dialog.present()
+
     def on_preferences(self, _action, _param):
         """Show settings window."""
+        from wordbook.settings_window import SettingsWindow
+
         window = SettingsWindow(parent=self, transient_for=self)
         window.present()
 
     def on_random_word(self, _action, _param):
         """Search a random word from the wordlist."""
-        random_word = random.choice(self._wn_future.result()["list"])
+        random_word = random.choice(self._wordlist_future.result()["list"])
         random_word = random_word.replace("_", " ")
         self.trigger_search(random_word)
 
@@ -216,108 +288,192 @@ class WordbookWindow(Adw.ApplicationWindow):
         """Search selected text from inside or outside the window."""
         self.trigger_search(self._primary_clipboard_text)
 
-    def on_search_clicked(self, _button=None, pass_check=False, text=None):
+    def on_search_clicked(self, _button=None, pass_check=False, text=None, live=False):
         """Pass data to search function and set TextView data."""
         if text is None:
             text = self._search_entry.get_text().strip()
-        self._page_switch(Page.SPINNER)
-        self._add_to_queue(text, pass_check)
+        self._set_page(Page.SPINNER)
+        # Live searches wait for typing to pause, other searches start at once.
+        self._search_scheduler.submit(text, pass_check, Settings.get().live_search_delay / 1000 if live else 0)
 
-    def threaded_search(self, pass_check=False):
-        """Manage a single thread to search for each term."""
+    def _run_search(self, text, generation, pass_check=False):
+        """Search for text on the search scheduler's thread, stopping as soon as a newer search is requested."""
         except_list = ("fortune -a", "cowfortune")
-        status = SearchStatus.NONE
-        while self._search_queue:
-            text = self._search_queue.pop(0)
-            orig_term = self._searched_term
-            self._searched_term = text
-            if text and (pass_check or not text == orig_term or text in except_list):
-                if not text.strip() == "":
-                    GLib.idle_add(self._def_view.set_markup, "")
-
-                    out = self._search(text)
-
-                    if out is None:
-                        status = SearchStatus.RESET
-                        continue
-
-                    def validate_result(text, out_string):
-                        # Add to history
-                        history_object = HistoryObject(text)
-                        if text not in self._search_history_list:
-                            self._search_history_list.append(text)
-                            self._search_history.insert(0, history_object)
-
-                        GLib.idle_add(self._def_view.set_markup, out_string)
-                        return SearchStatus.SUCCESS
-
-                    if out["out_string"] is not None:
-                        status = validate_result(text, out["out_string"])
-                    elif out["result"] is not None:
-                        status = validate_result(text, self._process_result(out["result"]))
-                    else:
-                        status = SearchStatus.FAILURE
-                        self._last_search_fail = True
-                        continue
-
-                    term_view_text = f'<span size="large" weight="bold">{out["term"].strip()}</span>'
-                    GLib.idle_add(
-                        self._term_view.set_markup,
-                        term_view_text,
-                    )
-                    GLib.idle_add(
-                        self._term_view.set_tooltip_markup,
-                        term_view_text,
-                    )
-
-                    pron = "<i>" + out["pronunciation"].strip().replace("\n", "") + "</i>"
-                    GLib.idle_add(
-                        self._pronunciation_view.set_markup,
-                        pron,
-                    )
-                    GLib.idle_add(
-                        self._pronunciation_view.set_tooltip_markup,
-                        pron,
-                    )
-
-                    if text not in except_list:
-                        GLib.idle_add(self._speak_button.set_visible, True)
-
-                    self._last_search_fail = False
-                    continue
-
-                status = SearchStatus.RESET
-                continue
-
-            if text and text == orig_term and not self._last_search_fail:
-                status = SearchStatus.SUCCESS
-                continue
-
-            if text and text == orig_term and self._last_search_fail:
-                status = SearchStatus.FAILURE
-                continue
-
-            status = SearchStatus.RESET
-
-        if status == SearchStatus.SUCCESS:
-            self._page_switch(Page.CONTENT)
-        elif status == SearchStatus.FAILURE:
-            self._page_switch(Page.SEARCH_FAIL)
-        elif status == SearchStatus.RESET:
-            self._page_switch(Page.WELCOME)
+        if not text or text.isspace():
+            self._update_view(generation, searched=(text, None, False), page=Page.WELCOME)
+            return
+        if text == self._searched_term and not pass_check and text not in except_list:
+            self._update_view(generation, page=Page.SEARCH_FAIL if self._last_search_fail else Page.CONTENT)
+            return
+
+        with tracing.TRACER.span("search", text):
+            out = self._search(text)
+        if not self._search_scheduler.is_current(generation):
+            return
+
+        if out is None:
+            self._update_view(generation, searched=(None, None, False), page=Page.WELCOME)
+            return
+
+        result = None
+        if out["out_string"] is not None:
+            definition = out["out_string"]
+        elif out["result"] is not None:
+            result = out["result"]
+            definition = self._process_result(result)
+        else:
+            self._update_view(
+                generation,
+                searched=(text, None, True),
+                suggestions=self._get_suggestions(text),
+                page=Page.SEARCH_FAIL,
+            )
+            return
+
+        changes = {
+            "searched": (text, result, False),
+            "history": text,
+            "definition": definition,
+            "term": f'<span size="large" weight="bold">{out["term"].strip()}</span>',
+            "pronunciation": out["pronunciation"] or "",
+            "page": Page.CONTENT,
+        }
+        if text not in except_list:
+            changes["speak"] = True
+        self._update_view(generation, **changes)
+
+        if out["pronunciation"] is None:
+            # Shown once espeak-ng is done, so that the definition does not have to wait for it.
+            if not self._search_scheduler.is_current(generation):
+                return
+            pronunciation = base.get_final_pronunciation(out["term"], Settings.get().pronunciations_accent)
+            self._update_view(generation, pronunciation=pronunciation)
+
+    def _update_view(self, generation, **changes):
+        """
+        Queue changes to the views for a search, to be applied together on the main loop just before the next frame.
+
+        Changes queued before they are applied are merged, and changes of superseded searches are dropped.
+        """
+        with self._view_lock:
+            if self._view_generation != generation:
+                self._view_changes = {}
+                self._view_generation = generation
+            self._view_changes.update(changes)
+            if self._view_update_queued:
+                return
+            self._view_update_queued = True
+        GLib.idle_add(
+            tracing.TRACER.wrap_idle("idle.view", self._apply_view_changes),
+            priority=GLib.PRIORITY_HIGH_IDLE + 10,  # Before GTK lays out and draws the frame.
+        )
 
-        self._active_thread = None
+    def _apply_view_changes(self):
+        """Apply the changes queued by _update_view, if their search is still the latest one."""
+        with self._view_lock:
+            changes, self._view_changes = self._view_changes, {}
+            generation = self._view_generation
+            self._view_update_queued = False
+        if not changes or not self._search_scheduler.is_current(generation):
+            return
+        if "searched" in changes:
+            # Only the search whose results are shown is remembered, so that superseded ones are searched again.
+            self._searched_term, self._last_result, self._last_search_fail = changes["searched"]
+        if "history" in changes:
+            self._add_to_history(changes["history"])
+        if "definition" in changes:
+            self._show_definition(changes["definition"])
+        if "term" in changes:
+            self._term_view.set_markup(changes["term"])
+            self._term_view.set_tooltip_markup(changes["term"])
+        if "pronunciation" in changes:
+            pronunciation = changes["pronunciation"].strip().replace("\n", "")
+            pron = f"<i>{pronunciation}</i>" if pronunciation else ""
+            self._pronunciation_view.set_markup(pron)
+            self._pronunciation_view.set_tooltip_markup(pron)
+        if "speak" in changes:
+            self._speak_button.set_visible(changes["speak"])
+        if "suggestions" in changes:
+            self._show_suggestions(changes["suggestions"])
+        if "page" in changes:
+            self._set_page(changes["page"])
+
+    def _add_to_history(self, text):
+        """
+        Move a searched term to the top of the history sidebar, and record the lookup in a task.
+
+        The count shown is corrected once the lookup is recorded, for terms not loaded into the sidebar yet.
+        """
+        previous = self._search_history_items.pop(text, None)
+        if previous is not None:
+            found, position = self._search_history.find(previous)
+            if found:
+                self._search_history.remove(position)
+        history_object = HistoryObject(text, previous.count + 1 if previous is not None else 1)
+        self._search_history_items[text] = history_object
+        self._search_history.insert(0, history_object)
+        SCHEDULER.submit(Priority.COMPLETION, self._record_lookup, history_object)
+
+    def _record_lookup(self, history_object):
+        """Record a lookup in the history store, and update the count shown for it."""
+        base.HISTORY_STORE.add(history_object.term)
+        entry = base.HISTORY_STORE.get(history_object.term)
+        if entry is not None and entry.count != history_object.count:
+            GLib.idle_add(self._update_history_count, history_object, entry.count)
+
+    def _update_history_count(self, history_object, count):
+        """Show the recorded count of a history item, if it is still in the sidebar."""
+        history_object.count = count
+        found, position = self._search_history.find(history_object)
+        if found:
+            self._search_history.items_changed(position, 1, 1)
+
+    def _load_history_page(self):
+        """Append the next page of the search history to the sidebar."""
+        entries = base.HISTORY_STORE.page(self._search_history.get_n_items(), HISTORY_PAGE_SIZE)
+        history_objects = [
+            HistoryObject(entry.term, entry.count) for entry in entries if entry.term not in self._search_history_items
+        ]
+        self._search_history_items.update((history_object.term, history_object) for history_object in history_objects)
+        self._search_history.splice(self._search_history.get_n_items(), 0, history_objects)
 
     def trigger_search(self, text):
         """Trigger search action."""
+        if self._wn_future is None:
+            self.lookup_term = text  # Searched once WordNet is opened.
+            return
         GLib.idle_add(self._search_entry.set_text, text)
         GLib.idle_add(self.on_search_clicked, text=text)
 
     def _on_dark_style(self, _object, _param):
         """Refresh definition view when switching dark theme."""
-        if self._searched_term is not None:
+        if self._searched_term is None:
+            return
+        if self._last_result is not None and not self._last_search_fail:
+            # WordNet results are theme-independent, so they only need to be rendered again.
+            self._show_definition(self._process_result(self._last_result))
+        else:
             self.on_search_clicked(pass_check=True, text=self._searched_term)
 
+    @staticmethod
+    def _on_cdef_changed(_monitor, file, other_file, event_type):
+        """
+        Update the custom definitions index when the custom definitions folder changes.
+
+        The file is read and stored by a task, keyed by its name so that a burst of events for one file updates it once.
+        """
+
+        def update(change, name):
+            SCHEDULER.submit(Priority.PREFETCH, change, name, key=("cdef", name))
+
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.MOVED_IN):
+            update(base.CDEF_INDEX.add, file.get_basename())
+        elif event_type in (Gio.FileMonitorEvent.DELETED, Gio.FileMonitorEvent.MOVED_OUT):
+            update(base.CDEF_INDEX.remove, file.get_basename())
+        elif event_type == Gio.FileMonitorEvent.RENAMED:
+            update(base.CDEF_INDEX.remove, file.get_basename())
+            update(base.CDEF_INDEX.add, other_file.get_basename())
+
     def _on_def_press_event(self, _click, n_press, _x, _y):
         """Handle double click on definition view."""
         if Settings.get().double_click:
@@ -339,29 +495,41 @@ class WordbookWindow(Adw.ApplicationWindow):
             cancellable = Gio.Cancellable()
             clipboard.read_text_async(cancellable, on_paste)
 
-    def _on_destroy(self, _window):
-        """Detect closing of the window."""
-        Settings.get().history = self._search_history_list[-10:]
+    def _on_realize(self, _window):
+        self._first_frame_handler = self.get_frame_clock().connect("after-paint", self._on_first_frame)
+
+    def _on_first_frame(self, frame_clock):
+        """Continue setting up once the window is on screen."""
+        frame_clock.disconnect(self._first_frame_handler)
+        self.get_application().report_startup("first-frame")
+        GLib.idle_add(self._setup_deferred)
 
     def _on_entry_changed(self, _entry):
         """Detect changes to text and do live search if enabled."""
 
-        self._completion_request_count += 1
-        if self._completion_request_count == 1:
-            threading.Thread(
-                target=self._update_completions,
-                args=[self._search_entry.get_text()],
-                daemon=True,
-            ).start()
+        if self._wordlist_future is not None:
+            # Replaces the completions still waiting to be computed for earlier text.
+            SCHEDULER.submit(
+                Priority.COMPLETION,
+                self._update_completions,
+                self._search_entry.get_text(),
+                key="completions",
+                after=self._wordlist_future,
+            )
 
         if Settings.get().live_search:
-            GLib.idle_add(self.on_search_clicked)
+            self.on_search_clicked(live=True)
 
     @staticmethod
     def _on_exit_clicked(_widget):
         """Handle exit button click in network failure page."""
         sys.exit()
 
+    def _on_suggestion_clicked(self, button):
+        """Search for a suggested word."""
+        self._search_entry.set_text(button.get_label())
+        self.on_search_clicked(text=button.get_label())
+
     def _on_link_activated(self, _widget, data):
         """Search for terms that are marked as hyperlinks."""
         if data.startswith("search;"):
@@ -386,6 +554,11 @@ class WordbookWindow(Adw.ApplicationWindow):
             return Gdk.EVENT_STOP
         return Gdk.EVENT_PROPAGATE
 
+    def _on_history_edge_reached(self, _scroll, position):
+        """Load more of the search history when the end of the sidebar is reached."""
+        if position == Gtk.PositionType.BOTTOM:
+            self._load_history_page()
+
     def _on_history_item_activated(self, _widget, row):
         """Handle history item clicks."""
         term = row.get_first_child().get_first_child().get_label()
@@ -396,17 +569,6 @@ class WordbookWindow(Adw.ApplicationWindow):
         self._page_switch(Page.DOWNLOAD)
         self._dl_wn()
 
-    def _add_to_queue(self, text, pass_check=False):
-        """Add search term to queue."""
-        if self._search_queue:
-            self._search_queue.pop(0)
-        self._search_queue.append(text)
-
-        if self._active_thread is None:
-            # If there is no active thread, create one and start it.
-            self._active_thread = threading.Thread(target=self.threaded_search, args=[pass_check], daemon=True)
-            self._active_thread.start()
-
     def _on_scroll_event(self, adjustment):
         """Add or remove top border in window depending on scroll position."""
         if adjustment.get_value() != 0.0:
@@ -425,7 +587,7 @@ class WordbookWindow(Adw.ApplicationWindow):
     def progress_complete(self):
         """Run upon completion of loading."""
         GLib.idle_add(self.download_status_page.set_title, _("Ready."))
-        self._wn_future = base.get_wn_file(self._retry_dl_wn)
+        self._load_wordnet()
         GLib.idle_add(self._set_header_sensitive, True)
         self._page_switch(Page.WELCOME)
         if self.lookup_term:
@@ -436,6 +598,10 @@ class WordbookWindow(Adw.ApplicationWindow):
     def _create_label(element):
         """Create labels for history list."""
         box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, visible=True)
+        if element.count > 1:
+            box.set_tooltip_text(
+                ngettext("Looked up {count} time", "Looked up {count} times", element.count).format(count=element.count)
+            )
         label = Gtk.Label(
             label=element.term,
             margin_top=8,
@@ -453,72 +619,99 @@ class WordbookWindow(Adw.ApplicationWindow):
         dialog.run()
         dialog.destroy()
 
+    def _get_suggestions(self, text):
+        """Get spelling suggestions for a failed search, if the spelling index is ready."""
+        if self._spelling_future is None or not self._spelling_future.done():
+            return []
+        spelling_index = self._spelling_future.result()
+        return spelling_index.suggest(text) if spelling_index is not None else []
+
+    def _show_suggestions(self, suggestions):
+        """Offer suggestions on the search failure page."""
+        while (child := self._suggestions_box.get_first_child()) is not None:
+            self._suggestions_box.remove(child)
+        for suggestion in suggestions:
+            button = Gtk.Button(label=suggestion)
+            button.add_css_class("pill")
+            button.connect("clicked", self._on_suggestion_clicked)
+            self._suggestions_box.append(button)
+        self._search_fail_status_page.set_description(_("Did you mean:") if suggestions else None)
+
     def _page_switch(self, page):
+        """Switch main stack pages from any thread."""
+        GLib.idle_add(self._set_page, page)
+
+    def _set_page(self, page):
         """Switch main stack pages."""
-        if page == "content_page":
-            GLib.idle_add(self._main_scroll.get_vadjustment().set_value, 0)
-        if self._main_stack.get_visible_child_name == page:
-            return True
-        GLib.idle_add(self._main_stack.set_visible_child_name, page)
-        return False
+        if page == Page.CONTENT:
+            self._main_scroll.get_vadjustment().set_value(0)
+        if self._main_stack.get_visible_child_name() != page:
+            self._main_stack.set_visible_child_name(page)
 
     def _process_result(self, result: dict):
-        """Process results from wn."""
-        out_string = ""
-        word_col = result["word_col"]
-        sen_col = result["sen_col"]
-        first = True
-        for pos in result.keys():
-            i = 0
-            orig_synset = None
-            if pos not in ("word_col", "sen_col") and result[pos]:
-                for synset in sorted(result[pos], key=lambda k: k["name"]):
-                    synset_name = synset["name"]
-                    if orig_synset is None:
-                        i = 1
-                        if not first:
-                            out_string += "\n\n"
-                        out_string += f"{synset_name} ~ <b>{pos}</b>"
-                        orig_synset = synset_name
-                        first = False
-                    elif synset_name != orig_synset:
-                        i = 1
-                        out_string += f"\n\n{synset_name} ~ <b>{pos}</b>"
-                        orig_synset = synset_name
-                    else:
-                        i += 1
-                    out_string += f'\n  <b>{i}</b>: {synset["definition"]}'
-
-                    for example in synset["examples"]:
-                        out_string += f'\n        <span foreground="{sen_col}">{example}</span>'
-
-                    pretty_syn = self._process_word_links(synset["syn"], word_col)
-                    if pretty_syn:
-                        out_string += f"\n        Synonyms:<i> {pretty_syn}</i>"
-
-                    pretty_ant = self._process_word_links(synset["ant"], word_col)
-                    if pretty_ant:
-                        out_string += f"\n        Antonyms:<i> {pretty_ant}</i>"
-
-                    pretty_sims = self._process_word_links(synset["sim"], word_col)
-                    if pretty_sims:
-                        out_string += f"\n        Similar to:<i> {pretty_sims}</i>"
-
-                    pretty_alsos = self._process_word_links(synset["also_sees"], word_col)
-                    if pretty_alsos:
-                        out_string += f"\n        Also see:<i> {pretty_alsos}</i>"
-        return out_string
+        """Process results from wn into the sections of the definition list."""
+        return base.process_result_sections(result, *base.get_colors(self._style_manager.get_dark()))
+
+    def _show_definition(self, definition):
+        """
+        Show a definition in the definition list.
+
+        definition is either markup, shown as a single row, or the sections of a WordNet result, shown as an expanded
+        heading row per section with a row per synset under it. Only the rows on screen are laid out.
+        """
+        with tracing.TRACER.span("definition_view"):
+            root = Gio.ListStore.new(DefinitionObject)
+            if isinstance(definition, str):
+                root.append(DefinitionObject(definition))
+            else:
+                for heading, synsets in definition:
+                    root.append(DefinitionObject(heading, synsets))
+            tree = Gtk.TreeListModel.new(root, False, True, self._create_definition_children)
+            self._def_list.set_model(Gtk.NoSelection.new(tree))
+        if tracing.TRACER.enabled:
+            # Also record the time until the rows on screen have been laid out and drawn.
+            started = time.perf_counter()
+            frame_clock = self.get_frame_clock()
+
+            def on_after_paint(_frame_clock):
+                frame_clock.disconnect(handler)
+                tracing.TRACER.record("definition_view.frame", time.perf_counter() - started)
+
+            handler = frame_clock.connect("after-paint", on_after_paint)
 
     @staticmethod
-    def _process_word_links(word_list, word_col):
-        """Process word links like synonyms, antonyms, etc."""
-        pretty_list = []
-        for word in word_list:
-            pretty_list.append(f'<span foreground="{word_col}">' f'<a href="search;{word}">{word}</a>' "</span>")
-        if pretty_list:
-            pretty_list = ", ".join(pretty_list)
-            return pretty_list
-        return ""
+    def _create_definition_children(item):
+        """Return the synset rows under a section heading, or None for rows without any."""
+        if item.synsets is None:
+            return None
+        children = Gio.ListStore.new(DefinitionObject)
+        for synset in item.synsets:
+            children.append(DefinitionObject(synset))
+        return children
+
+    def _on_definition_setup(self, _factory, list_item):
+        """Create the widgets of a definition row."""
+        label = Gtk.Label(xalign=0, wrap=True, selectable=True, use_markup=True)
+        label.set_extra_menu(self._def_extra_menu_model)
+        label.connect("activate-link", self._on_link_activated)
+        expander = Gtk.TreeExpander()
+        expander.set_child(label)
+        list_item.set_child(expander)
+
+    @staticmethod
+    def _on_definition_bind(_factory, list_item):
+        """Show a definition row."""
+        row = list_item.get_item()
+        expander = list_item.get_child()
+        expander.set_list_row(row)
+        expander.get_child().set_markup(row.get_item().markup)
+        list_item.set_activatable(row.is_expandable())
+
+    def _on_definition_activated(self, list_view, position):
+        """Collapse or expand a section of the definition list."""
+        row = list_view.get_model().get_item(position)
+        if row is not None and row.is_expandable():
+            row.set_expanded(not row.get_expanded())
 
     def _search(self, search_text):
         """Clean input text, give errors and pass data to formatter."""
@@ -527,9 +720,10 @@ class WordbookWindow(Adw.ApplicationWindow):
             return base.format_output(
                 text,
                 self._style_manager.get_dark(),
-                self._wn_future.result()["instance"],
+                self._wn_future.result(),
                 Settings.get().cdef,
                 accent=Settings.get().pronunciations_accent,
+                pronounce=False,
             )
         if not Settings.get().live_search:
             GLib.idle_add(
@@ -537,39 +731,50 @@ class WordbookWindow(Adw.ApplicationWindow):
                 _("Invalid input"),
                 _("Nothing definable was found in your search input"),
             )
-        self._searched_term = None
         return None
 
     def _update_completions(self, text):
         """Update completions from wordlist and cdef folder."""
-        while self._completion_request_count > 0:
-            completer_liststore = Gtk.ListStore(str)
-            _complete_list = []
-
-            for item in self._wn_future.result()["list"]:
+        wn_file = self._wordlist_future.result()
+        if wn_file is None:
+            return
+        completer_liststore = Gtk.ListStore(str)
+        _complete_list = wn_file["index"].complete(text, 10)
+
+        if Settings.get().cdef:
+            for item in base.CDEF_INDEX.complete(text, 10):
+                # FIXME: There is no indicator that this is a custom definition
+                # Not a priority but a nice-to-have.
                 if len(_complete_list) >= 10:
                     break
-                item = item.replace("_", " ")
-                if item.lower().startswith(text.lower()) and item not in _complete_list:
+                if item not in _complete_list:
                     _complete_list.append(item)
 
-            if Settings.get().cdef:
-                for item in os.listdir(utils.CDEF_DIR):
-                    # FIXME: There is no indicator that this is a custom definition
-                    # Not a priority but a nice-to-have.
-                    if len(_complete_list) >= 10:
-                        break
-                    item = escape(item).replace("_", " ")
-                    if item.lower().startswith(text.lower()) and item not in _complete_list:
-                        _complete_list.append(item)
-
-            _complete_list = sorted(_complete_list, key=str.casefold)
-            for item in _complete_list:
-                completer_liststore.append((item,))
-
-            self._completion_request_count -= 1
-            GLib.idle_add(self.completer.set_model, completer_liststore)
-            GLib.idle_add(self.completer.complete)
+        # Terms looked up before come first, the most frequently looked up at the top.
+        history = [entry.term for entry in base.HISTORY_STORE.complete(text, 10)]
+        _complete_list = history + sorted((item for item in _complete_list if item not in history), key=str.casefold)
+        for item in _complete_list[:10]:
+            completer_liststore.append((item,))
+
+        GLib.idle_add(self.completer.set_model, completer_liststore)
+        GLib.idle_add(self.completer.complete)
+
+    def _load_wordnet(self):
+        """Open WordNet for lookups, then load the wordlist for completions and random words."""
+        self._wn_future = base.get_wn_instance(self._retry_dl_wn)
+        self._wordlist_future = base.get_wn_file(self._wn_future)
+        self._wordlist_future.add_done_callback(lambda _future: GLib.idle_add(self._on_wordlist_ready))
+        self._spelling_future = base.get_spelling_index(self._wordlist_future)
+
+    def _on_wordlist_ready(self):
+        """Enable the features that depend on the wordlist."""
+        self._wn_future.add_done_callback(
+            lambda _future: GLib.idle_add(self.get_application().report_startup, "ready")
+        )
+        if self._wordlist_future.result() is not None:
+            self.lookup_action("random-word").set_enabled(True)
+            if Settings.get().pregenerate_pronunciations:
+                self.pregenerate_pronunciations()
 
     def _set_header_sensitive(self, status):
         """Disable/enable header buttons."""
@@ -582,13 +787,16 @@ class WordbookWindow(Adw.ApplicationWindow):
         self._set_header_sensitive(False)
         if not self._wn_downloader.check_status():
             self.download_status_page.set_description(_("Downloading WordNet…"))
-            threading.Thread(target=self._try_dl_wn).start()
+            SCHEDULER.submit(Priority.INTERACTIVE, self._try_dl_wn)
 
     def _try_dl_wn(self):
         """Attempt to download WordNet data."""
+        from wordbook.progress import ProgressUpdater
+
+        wn = base.import_wn()
         try:
             self._wn_downloader.download(ProgressUpdater)
-        except Error as err:
+        except wn.Error as err:
             self._network_fail_status_page.set_description(f"<small><tt>Error: {err}</tt></small>")
             utils.log_warning(err)
             self._page_switch(Page.NETWORK_FAIL)
@@ -607,13 +815,6 @@ class WordbookWindow(Adw.ApplicationWindow):
         )
 
 
-class SearchStatus(Enum):
-    NONE = 0
-    SUCCESS = 1
-    FAILURE = 2
-    RESET = 3
-
-
 class Page(str, Enum):
     CONTENT = "content_page"
     DOWNLOAD = "download_page"
@@ -623,40 +824,21 @@ class Page(str, Enum):
     WELCOME = "welcome_page"
 
 
-class HistoryObject(GObject.Object):
-    term = ""
+class DefinitionObject(GObject.Object):
+    markup = ""
+    synsets = None
 
-    def __init__(self, term):
+    def __init__(self, markup, synsets=None):
         super().__init__()
-        self.term = term
+        self.markup = markup
+        self.synsets = synsets
 
 
-class ProgressUpdater(ProgressHandler):
-    def update(self, n: int = 1, force: bool = False):
-        """Update the progress bar."""
-        self.kwargs["count"] += n
-        if self.kwargs["total"] > 0:
-            progress_fraction = self.kwargs["count"] / self.kwargs["total"]
-            GLib.idle_add(
-                Gio.Application.get_default().win.loading_progress.set_fraction,
-                progress_fraction,
-            )
-
-    @staticmethod
-    def flash(message):
-        """Update the progress label."""
-        if message == "Database":
-            GLib.idle_add(
-                Gio.Application.get_default().win.download_status_page.set_description,
-                _("Building Database…"),
-            )
-        else:
-            GLib.idle_add(
-                Gio.Application.get_default().win.download_status_page.set_description,
-                message,
-            )
+class HistoryObject(GObject.Object):
+    term = ""
+    count = 1
 
-    def close(self):
-        """Signal the completion of building the WordNet database."""
-        if self.kwargs["message"] not in ("Download", "Read"):
-            Gio.Application.get_default().win.progress_complete()
+    def __init__(self, term, count=1):
+        super().__init__()
+        self.term = term
+        self.count = count
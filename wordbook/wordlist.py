@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2016-2024 Mufeed Ali <mufeed@kumo.foo>
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+wordlist contains the indexes built over the WordNet wordlist.
+
+wordlist is a part of Wordbook.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from typing import List, Set
+
+from wordbook import utils
+
+SNAPSHOT_MAGIC = b"WBWLIST2"
+SPELLING_MAGIC = b"WBSPELL1"
+
+
+def normalize(term: str) -> str:
+    """Normalize a term for case and underscore insensitive matching."""
+    return term.replace("_", " ").casefold()
+
+
+def deletes(term: str, distance: int) -> Set[str]:
+    """Return term and every string made by deleting up to distance characters from it."""
+    variants = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1 :] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """
+    Return the optimal string alignment distance between two strings.
+
+    Substitutions, insertions, deletions and swaps of adjacent characters count as one edit. Returns limit + 1 once
+    the distance is known to be larger than limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i] + [0] * len(second)
+        for j, second_char in enumerate(second, 1):
+            cost = first_char != second_char
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and first_char == second[j - 2] and first[i - 2] == second_char:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class PrefixIndex:
+    """Answers prefix queries over the wordlist through binary search."""
+
+    def __init__(self, keys: Sequence[str], words: Sequence[str]):
+        """
+        Initialize the index.
+
+        keys must be sorted normalized terms and words their display forms, in the same order.
+        """
+        self.keys = keys
+        self.words = words
+
+    def __len__(self):
+        return len(self.words)
+
+    @classmethod
+    def from_lemmas(cls, lemmas: Iterable[str]) -> "PrefixIndex":
+        """Build the index from raw WordNet lemmas."""
+        entries = sorted({(normalize(lemma), lemma.replace("_", " ")) for lemma in lemmas})
+        return cls([key for key, _word in entries], [word for _key, word in entries])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Return up to limit display words starting with prefix, in sorted order."""
+        key = normalize(prefix)
+        matches: List[str] = []
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and len(matches) < limit and self.keys[i].startswith(key):
+            word = self.words[i]
+            if word not in matches:
+                matches.append(word)
+            i += 1
+        return matches
+
+
+class SpellingIndex:
+    """
+    Suggests wordlist entries close to a misspelled term, using a symmetric deletion index.
+
+    Words are grouped by their first PREFIX_LENGTH characters. The index maps a checksum of every string made by
+    deleting up to MAX_DISTANCE characters from a group's prefix to the group, stored as one sorted array of
+    (checksum << 32 | group) integers. A query only has to look up the deletions of its own prefix, and compute edit
+    distances for the words of the groups found.
+    """
+
+    MAX_DISTANCE = 2
+    PREFIX_LENGTH = 7
+    MIN_LENGTH = 3  # Shorter terms are too ambiguous to suggest anything useful.
+
+    def __init__(self, words: PrefixIndex, starts: Sequence[int], entries: Sequence[int]):
+        """
+        Initialize the index.
+
+        starts holds the position in words.keys at which each group begins. entries holds the sorted deletion
+        entries.
+        """
+        self.words = words
+        self.starts = starts
+        self.entries = entries
+
+    @staticmethod
+    def _checksum(variant: str) -> int:
+        return zlib.crc32(variant.encode("utf-8"))
+
+    @classmethod
+    def build(cls, words: PrefixIndex) -> "SpellingIndex":
+        """Build the index for the words of a prefix index."""
+        starts = array("I")
+        entries = []
+        prefix = None
+        for position, key in enumerate(words.keys):
+            if key[: cls.PREFIX_LENGTH] == prefix:
+                continue
+            prefix = key[: cls.PREFIX_LENGTH]
+            group = len(starts)
+            starts.append(position)
+            entries.extend(cls._checksum(variant) << 32 | group for variant in deletes(prefix, cls.MAX_DISTANCE))
+        starts.append(len(words.keys))
+        entries.sort()
+        return cls(words, starts, array("Q", entries))
+
+    def suggest(self, term: str, limit: int = 5) -> List[str]:
+        """Return up to limit display words within MAX_DISTANCE edits of term, closest first."""
+        query = normalize(term.strip())
+        if len(query) < self.MIN_LENGTH:
+            return []
+
+        groups = set()
+        for variant in deletes(query[: self.PREFIX_LENGTH], self.MAX_DISTANCE):
+            checksum = self._checksum(variant) << 32
+            i = bisect_left(self.entries, checksum)
+            while i < len(self.entries) and self.entries[i] >> 32 == checksum >> 32:
+                groups.add(self.entries[i] & 0xFFFFFFFF)
+                i += 1
+
+        ranked = []
+        for group in groups:
+            for position in range(self.starts[group], self.starts[group + 1]):
+                key = self.words.keys[position]
+                distance = edit_distance(query, key, self.MAX_DISTANCE)
+                if 0 < distance <= self.MAX_DISTANCE:
+                    # Prefer fewer edits, then words that keep the first letter and length of the query.
+                    ranked.append((distance, key[0] != query[0], abs(len(key) - len(query)), key, position))
+
+        suggestions: List[str] = []
+        for *_rank, position in sorted(ranked):
+            word = self.words.words[position]
+            if word not in suggestions:
+                suggestions.append(word)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+
+class StringTable(Sequence):
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offsets array."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        """Initialize the table. offsets holds len + 1 entries delimiting each string in blob."""
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringTable index out of range")
+        return str(self._blob[self._offsets[index] : self._offsets[index + 1]], "utf-8")
+
+    @staticmethod
+    def pack(strings: Iterable[str]) -> bytes:
+        """Serialize strings into the on-disk table format."""
+        offsets = array("I", [0])
+        blob = bytearray()
+        for string in strings:
+            blob += string.encode("utf-8")
+            offsets.append(len(blob))
+        return struct.pack("=I", len(offsets)) + offsets.tobytes() + struct.pack("=I", len(blob)) + bytes(blob)
+
+    @classmethod
+    def unpack_from(cls, buffer: memoryview, position: int):
+        """
+        Map a table found at position in buffer without copying. Return the table and the position after it.
+
+        Tables start at the next multiple of 4 bytes, so that the offsets are aligned. Raises ValueError if the buffer
+        ends before the table does.
+        """
+        position += -position % 4
+        (count,) = struct.unpack_from("=I", buffer, position)
+        position += 4
+        offsets = buffer[position : position + count * 4].cast("I")
+        position += count * 4
+        if count == 0 or len(offsets) != count:
+            raise ValueError("Truncated string table.")
+        (size,) = struct.unpack_from("=I", buffer, position)
+        position += 4
+        blob = buffer[position : position + size]
+        if len(blob) != size or offsets[-1] != size:
+            raise ValueError("Truncated string table.")
+        return cls(offsets, blob), position + size
+
+
+def _read_header(buffer: memoryview, magic: bytes, stamp: str) -> int | None:
+    """Check the magic and stamp at the start of a snapshot. Return the position after them, or None on mismatch."""
+    found_magic, stamp_length = struct.unpack_from(f"={len(magic)}sI", buffer)
+    position = struct.calcsize(f"={len(magic)}sI")
+    if found_magic != magic or str(buffer[position : position + stamp_length], "utf-8") != stamp:
+        return None
+    return position + stamp_length
+
+
+def _write_header(snapshot_file, magic: bytes, stamp: str):
+    encoded_stamp = stamp.encode("utf-8")
+    snapshot_file.write(struct.pack(f"={len(magic)}sI", magic, len(encoded_stamp)))
+    snapshot_file.write(encoded_stamp)
+
+
+def load_snapshot(path: str, stamp: str) -> PrefixIndex | None:
+    """Load a wordlist snapshot, or return None if it is missing or was built for another stamp."""
+    try:
+        with open(path, "rb") as snapshot_file:
+            buffer = memoryview(mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
+    try:
+        position = _read_header(buffer, SNAPSHOT_MAGIC, stamp)
+        if position is None:
+            return None
+        keys, position = StringTable.unpack_from(buffer, position)
+        words, position = StringTable.unpack_from(buffer, position)
+    except (struct.error, TypeError, ValueError, UnicodeDecodeError):
+        utils.log_warning("Ignoring unreadable wordlist snapshot.")
+        return None
+    return PrefixIndex(keys, words)
+
+
+def _replace(path: str, write):
+    """
+    Atomically replace the file at path with what write(file) writes.
+
+    Each writer gets its own temporary file, so that processes saving the same snapshot at once do not mix their
+    writes.
+    """
+    directory, name = os.path.split(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}-")
+    try:
+        with os.fdopen(descriptor, "wb") as snapshot_file:
+            write(snapshot_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def save_snapshot(path: str, stamp: str, index: PrefixIndex):
+    """Atomically write index to a wordlist snapshot for the given stamp."""
+
+    def write(snapshot_file):
+        _write_header(snapshot_file, SNAPSHOT_MAGIC, stamp)
+        for strings in (index.keys, index.words):
+            snapshot_file.write(b"\0" * (-snapshot_file.tell() % 4))  # Tables are aligned to 4 bytes.
+            snapshot_file.write(StringTable.pack(strings))
+
+    _replace(path, write)
+
+
+def load_spelling_snapshot(path: str, stamp: str, words: PrefixIndex) -> SpellingIndex | None:
+    """Load a spelling index snapshot for words, or return None if it is missing or was built for another stamp."""
+    try:
+        with open(path, "rb") as snapshot_file:
+            buffer = memoryview(mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
+    try:
+        position = _read_header(buffer, SPELLING_MAGIC, stamp)
+        if position is None:
+            return None
+        group_count, entry_count = struct.unpack_from("=II", buffer, position)
+        position += 8
+        starts = buffer[position : position + group_count * 4].cast("I")
+        position += group_count * 4
+        position += -position % 8  # Entries are aligned to 8 bytes.
+        entries = buffer[position : position + entry_count * 8].cast("Q")
+    except (struct.error, TypeError, ValueError, UnicodeDecodeError):
+        utils.log_warning("Ignoring unreadable spelling index snapshot.")
+        return None
+    if len(entries) != entry_count or (group_count and starts[-1] != len(words)):
+        return None
+    return SpellingIndex(words, starts, entries)
+
+
+def save_spelling_snapshot(path: str, stamp: str, index: SpellingIndex):
+    """Atomically write a spelling index snapshot for the given stamp."""
+
+    def write(snapshot_file):
+        _write_header(snapshot_file, SPELLING_MAGIC, stamp)
+        snapshot_file.write(struct.pack("=II", len(index.starts), len(index.entries)))
+        snapshot_file.write(bytes(index.starts))
+        snapshot_file.write(b"\0" * (-snapshot_file.tell() % 8))
+        snapshot_file.write(bytes(index.entries))
+
+    _replace(path, write)